@@ -1,7 +1,9 @@
+import json
 from uuid import UUID
 
 from langchain_core.tools import tool
 
+from app.core.exceptions import EntityNotFound
 from app.services.factory import ServiceFactory
 # from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
 
@@ -19,16 +21,21 @@ from app.services.factory import ServiceFactory
 #             return f"Shipment with ID: {shipment_id} not found"
 
 
+async def _current_payload(service: ServiceFactory, id: UUID) -> str:
+    # Versioned read, an entry cached before the last change isn't served
+    version = await service.shipment.get_version(id)
+    return await service.shipment.get_payload(id, version)
+
+
 @tool
 async def lookup_shipment(shipment_id: str) -> str:
     """
     Lookup a shipment by its ID and return its details.
     """
     async with ServiceFactory() as service:
-        shipment_details = await service.shipment.get(UUID(shipment_id))
-        if shipment_details:
-            return shipment_details
-        else:
+        try:
+            return await _current_payload(service, UUID(shipment_id))
+        except EntityNotFound:
             return f"Shipment with ID: {shipment_id} not found"
 
 
@@ -38,13 +45,13 @@ async def track_shipment(shipment_id: str) -> str:
     Track a shipment by its ID and return its current status.
     """
     async with ServiceFactory() as service:
-        s = await service.shipment.get(UUID(shipment_id))
-        if s:
-            # Get timeline
-            lines = ["Timeline:"]
-            for ev in sorted(s.timeline, key=lambda x: x.created_at):
-                lines.append(
-                    f"{ev.created_at}: {ev.status} - {ev.description}")
-            return "\n".join(lines)
-        else:
+        try:
+            s = json.loads(await _current_payload(service, UUID(shipment_id)))
+        except EntityNotFound:
             return f"Shipment with ID: {shipment_id} not found"
+        # Get timeline
+        lines = ["Timeline:"]
+        for ev in sorted(s["timeline"], key=lambda x: x["created_at"]):
+            lines.append(
+                f"{ev['created_at']}: {ev['status']} - {ev['description']}")
+        return "\n".join(lines)
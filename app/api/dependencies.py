@@ -7,22 +7,26 @@ from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.security import oauth2scheme_seller, oauth2scheme_partner
+from app.core.tokens import token_validator
+from app.database.loaders import LoadProfile, load_options
 from app.database.models import DeliveryPartner, Seller
-from app.database.redis import is_jti_blacklisted
 from app.database.session import get_session
+from app.schemas.principal import Principal
 from app.services.delivery_partner import DeliveryPartnerService
+from app.services.principals import principal_cache
 from app.services.seller import SellerService
 from app.services.shipment import ShipmentService
 from app.services.shipment_event import ShipmentEventService
-from app.utils import decode_access_token
+from app.services.shipment_stats import ShipmentStatsService
+from app.services.webhook import WebhookService
 
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
 
 
 # ACCESS TOKEN DATA DEP
 async def _get_access_token(token: str):
-    data = decode_access_token(token)
-    if data is None or await is_jti_blacklisted(data['jti']):
+    data = token_validator.decode(token)
+    if data is None or await token_validator.is_revoked(data):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid access token"
@@ -40,21 +44,47 @@ async def get_partner_access_token(token: Annotated[str, Depends(oauth2scheme_pa
                                    )
 
 
-async def get_current_seller(token_data: Annotated[dict, Depends(get_seller_access_token)], session: SessionDep):
-
-    seller = await session.get(Seller, UUID(token_data["user"]["id"]))
+async def get_current_seller(token_data: Annotated[dict, Depends(get_seller_access_token)], session: SessionDep) -> Principal:
+    seller = await principal_cache.get(session, Seller, UUID(token_data["user"]["id"]))
     if seller is None:
         raise HTTPException(status_code=401, detail="Not authorized")
     return seller
 
 
-async def get_current_partner(token_data: Annotated[dict, Depends(get_partner_access_token)], session: SessionDep):
-    partner = await session.get(DeliveryPartner, UUID(token_data["user"]["id"]))
+async def get_current_partner(token_data: Annotated[dict, Depends(get_partner_access_token)], session: SessionDep) -> Principal:
+    partner = await principal_cache.get(session, DeliveryPartner, UUID(token_data["user"]["id"]))
+    if partner is None:
+        raise HTTPException(status_code=401, detail="Not authorized")
+    return partner
+
+
+# Full entity, only for endpoints changing the partner itself
+async def get_current_partner_entity(token_data: Annotated[dict, Depends(get_partner_access_token)], session: SessionDep):
+    partner = await session.get(DeliveryPartner, UUID(token_data["user"]["id"]),
+                                options=load_options(LoadProfile.principal))
     if partner is None:
         raise HTTPException(status_code=401, detail="Not authorized")
     return partner
 
 
+# Shipment filters for the calling seller or partner
+async def get_shipment_scope(token_data: Annotated[dict, Depends(get_seller_access_token)], session: SessionDep) -> dict:
+    user_id = UUID(token_data["user"]["id"])
+    match token_data.get("role"):
+        case "seller":
+            return {"seller_id": user_id}
+        case "partner":
+            return {"delivery_partner_id": user_id}
+        case None:
+            # Tokens issued before the role claim, ids are unique
+            # across both tables so at most one of them matches
+            if await principal_cache.get(session, Seller, user_id):
+                return {"seller_id": user_id}
+            if await principal_cache.get(session, DeliveryPartner, user_id):
+                return {"delivery_partner_id": user_id}
+    raise HTTPException(status_code=401, detail="Not authorized")
+
+
 def get_shipment_service(session: SessionDep):
     return ShipmentService(session, DeliveryPartnerService(session), ShipmentEventService(session))
 
@@ -67,9 +97,22 @@ def get_seller_service(session: SessionDep):
     return SellerService(session)
 
 
+def get_shipment_stats_service(session: SessionDep):
+    return ShipmentStatsService(session)
+
+
+def get_webhook_service(session: SessionDep):
+    return WebhookService(session)
+
+
 ShipmentServiceDep = Annotated[ShipmentService, Depends(get_shipment_service)]
 SellerServiceDep = Annotated[SellerService, Depends(get_seller_service)]
 DeliveryPartnerServiceDep = Annotated[DeliveryPartnerService, Depends(
     get_delivery_partner_service)]
-SellerDep = Annotated[Seller, Depends(get_current_seller)]
-DeliveryPartnerDep = Annotated[DeliveryPartner, Depends(get_current_partner)]
+ShipmentStatsServiceDep = Annotated[ShipmentStatsService, Depends(
+    get_shipment_stats_service)]
+WebhookServiceDep = Annotated[WebhookService, Depends(get_webhook_service)]
+SellerDep = Annotated[Principal, Depends(get_current_seller)]
+DeliveryPartnerDep = Annotated[Principal, Depends(get_current_partner)]
+DeliveryPartnerEntityDep = Annotated[DeliveryPartner, Depends(get_current_partner_entity)]
+ShipmentScopeDep = Annotated[dict, Depends(get_shipment_scope)]
@@ -1,10 +1,12 @@
-from typing import Annotated
+from typing import Annotated, AsyncIterator
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
-from app.api.dependencies import DeliveryPartnerDep, DeliveryPartnerServiceDep, get_partner_access_token
-from app.database.redis import add_jti_to_blacklist
-from app.schemas.delivery_partner import CreateDeliveryPartner, ReadDeliveryPartner, UpdateDeliveryPartner
+from app.api.dependencies import DeliveryPartnerDep, DeliveryPartnerEntityDep, DeliveryPartnerServiceDep, ShipmentStatsServiceDep, get_partner_access_token
+from app.core.tokens import token_validator
+from app.schemas.delivery_partner import CreateDeliveryPartner, ManifestStop, ReadDeliveryPartner, UpdateDeliveryPartner
+from app.schemas.shipment import ShipmentStats
 
 
 delivery_partner_router = APIRouter(
@@ -24,6 +26,26 @@ async def login_delivery_partner(request_form: Annotated[OAuth2PasswordRequestFo
     return {"access_token": token, "type": "jwt"}
 
 
+# Shipment counts per status, from the rollup table
+@delivery_partner_router.get("/stats", response_model=ShipmentStats)
+async def partner_stats(partner: DeliveryPartnerDep, service: ShipmentStatsServiceDep):
+    return await service.get("partner", partner.id)
+
+
+async def _ndjson(stops: AsyncIterator[ManifestStop]):
+    async for stop in stops:
+        yield stop.model_dump_json() + "\n"
+
+
+# Active shipments grouped by destination, one NDJSON line per stop with stream=true
+@delivery_partner_router.get("/manifest", response_model=list[ManifestStop])
+async def partner_manifest(partner: DeliveryPartnerDep, service: DeliveryPartnerServiceDep, stream: bool = False):
+    stops = service.manifest(partner.id)
+    if stream:
+        return StreamingResponse(_ndjson(stops), media_type="application/x-ndjson")
+    return [stop async for stop in stops]
+
+
 @delivery_partner_router.get("/verify")
 async def verify_seller_email(token: str, service: DeliveryPartnerServiceDep):
     seller = await service.verify_email(token)
@@ -33,7 +55,7 @@ async def verify_seller_email(token: str, service: DeliveryPartnerServiceDep):
 @delivery_partner_router.post("/", response_model=ReadDeliveryPartner)
 async def update_delivery_partner(
     partner_update: UpdateDeliveryPartner,
-    partner: DeliveryPartnerDep,
+    partner: DeliveryPartnerEntityDep,
     service: DeliveryPartnerServiceDep
 ):
     return await service.update(
@@ -44,7 +66,7 @@ async def update_delivery_partner(
 
 @delivery_partner_router.get("/logout")
 async def logout(token_data: Annotated[dict, Depends(get_partner_access_token)]):
-    await add_jti_to_blacklist(token_data['jti'])
+    await token_validator.revoke(token_data)
     return {
         "detail": "Successfully logged out"
     }
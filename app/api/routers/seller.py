@@ -1,11 +1,14 @@
 from typing import Annotated
+from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import EmailStr
 
-from app.api.dependencies import SellerServiceDep, get_seller_access_token
-from app.database.redis import add_jti_to_blacklist
+from app.api.dependencies import SellerDep, SellerServiceDep, ShipmentStatsServiceDep, WebhookServiceDep, get_seller_access_token
+from app.core.tokens import token_validator
 from app.schemas.seller import CreateSeller, ReadSeller
+from app.schemas.shipment import ShipmentStats
+from app.schemas.webhook import CreateWebhook, CreatedWebhook, ReadWebhook
 
 
 seller_router = APIRouter(prefix="/seller", tags=['Sellers'])
@@ -22,6 +25,29 @@ async def read_seller(token_data: Annotated[dict, Depends(get_seller_access_toke
     return seller
 
 
+# Shipment counts per status, from the rollup table
+@seller_router.get("/stats", response_model=ShipmentStats)
+async def seller_stats(seller: SellerDep, service: ShipmentStatsServiceDep):
+    return await service.get("seller", seller.id)
+
+
+# Webhooks receiving the seller's shipment events in signed batches
+@seller_router.post("/webhooks", response_model=CreatedWebhook)
+async def create_webhook(webhook: CreateWebhook, seller: SellerDep, service: WebhookServiceDep):
+    return await service.subscribe(seller.id, webhook)
+
+
+@seller_router.get("/webhooks", response_model=list[ReadWebhook])
+async def get_webhooks(seller: SellerDep, service: WebhookServiceDep):
+    return await service.get_all(seller.id)
+
+
+@seller_router.delete("/webhooks/{id}")
+async def delete_webhook(id: UUID, seller: SellerDep, service: WebhookServiceDep):
+    await service.unsubscribe(seller.id, id)
+    return {"detail": "Webhook deleted"}
+
+
 @seller_router.get("/verify")
 async def verify_seller_email(token: str, service: SellerServiceDep):
     seller = await service.verify_email(token)
@@ -61,7 +87,7 @@ async def login_seller(request_form: Annotated[OAuth2PasswordRequestForm, Depend
 
 @seller_router.get("/logout")
 async def logout(token_data: Annotated[dict, Depends(get_seller_access_token)]):
-    await add_jti_to_blacklist(token_data['jti'])
+    await token_validator.revoke(token_data)
     return {
         "detail": "Successfully logged out"
     }
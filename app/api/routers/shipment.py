@@ -1,63 +1,151 @@
+from typing import Annotated, AsyncIterator, Literal, Sequence
 from uuid import UUID
-from fastapi import APIRouter, HTTPException, Request, status
-from fastapi.templating import Jinja2Templates
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import Row
 
-from app.api.dependencies import DeliveryPartnerDep, SellerDep, SessionDep, ShipmentServiceDep
+from app.api.dependencies import DeliveryPartnerDep, SellerDep, ShipmentScopeDep, ShipmentServiceDep
+from app.schemas.encoders import encode_list_row, encode_page
 from app.schemas.enums import TagNames
-from app.schemas.shipment import CreateShipment, GetShipment, ShipmentReview, UpdateShipment
-from app.utils import TEMPLATES_DIR
+from app.schemas.shipment import BulkShipmentResult, BulkUpdateShipment, CreateShipment, GetShipment, LocationPing, PingIngestResult, ShipmentPage, ShipmentReview, ShipmentSearch, UpdateShipment
 
 shipment_router = APIRouter(prefix="/shipment",
                             tags=["Shipment"])
 
-templates = Jinja2Templates(TEMPLATES_DIR)
-
-
-@shipment_router.get("/", response_model=None)
-async def get_all_shipments(service: ShipmentServiceDep):
-    shipments = await service.get_all()
-    if not shipments:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No shipments found"
+def _etag(id: UUID, version: int, representation: str) -> str:
+    return f'"{id.hex}-{version}-{representation}"'
+
+
+def _not_modified(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+async def _ndjson(rows: AsyncIterator[Row]):
+    async for row in rows:
+        yield encode_list_row(row) + b"\n"
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, bytes]]:
+    # Numbered lines of a streamed body
+    index, pending = 0, b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            yield index, line
+            index += 1
+    if pending:
+        yield index, pending
+
+
+def _page(rows: Sequence[Row], next_cursor: str | None) -> Response:
+    # Encoded straight from the rows, response_model only documents it
+    return Response(content=encode_page(rows, next_cursor), media_type="application/json")
+
+
+# Shipments of the calling seller or partner, newest first
+@shipment_router.get("/", response_model=ShipmentPage)
+async def get_all_shipments(
+    scope: ShipmentScopeDep,
+    service: ShipmentServiceDep,
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 50,
+    stream: bool = False,
+):
+    # Stream every remaining row as NDJSON instead of a single page
+    if stream:
+        return StreamingResponse(
+            _ndjson(service.stream(cursor, **scope)),
+            media_type="application/x-ndjson"
         )
 
-    return shipments
+    rows, next_cursor = await service.get_page(limit, cursor, **scope)
+    return _page(rows, next_cursor)
+
+
+# Filtered and sorted shipments of the calling seller or partner (must be before /{id})
+@shipment_router.get("/search", response_model=ShipmentPage)
+async def search_shipments(
+    search: Annotated[ShipmentSearch, Query()],
+    scope: ShipmentScopeDep,
+    service: ShipmentServiceDep,
+):
+    rows, next_cursor = await service.search(search, **scope)
+    return _page(rows, next_cursor)
+
+
+# Shipments with any (or all) of the given tags (must be before /{id})
+@shipment_router.get("/tagged", response_model=ShipmentPage)
+async def get_shipments_by_tag(
+    tag_name: Annotated[list[TagNames], Query(min_length=1)],
+    service: ShipmentServiceDep,
+    match: Literal["any", "all"] = "any",
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 50,
+):
+    rows, next_cursor = await service.get_page(
+        limit, cursor,
+        tag_ids=await service.get_tag_ids(tag_name),
+        match_all_tags=match == "all",
+    )
+    return _page(rows, next_cursor)
 
 
 # Tracking details of a shipment (must be before /{id})
 @shipment_router.get("/track", response_model=None)
-async def track_shipment(request: Request, id: UUID, service: ShipmentServiceDep):
-    shipment = await service.get(id)
-    if not shipment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Given id does not exist"
-        )
+async def track_shipment(
+    id: UUID,
+    service: ShipmentServiceDep,
+    accept: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    # Compact JSON variant for clients asking for it
+    as_json = bool(accept) and "application/json" in accept
+    version = await service.get_version(id)
+    etag = _etag(id, version, "track-json" if as_json else "track-html")
+    # Public and identical for every visitor, proxies may serve it
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=15, stale-while-revalidate=60",
+        "Vary": "Accept",
+    }
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=await service.get_tracking(id, version, as_json),
+        media_type="application/json" if as_json else "text/html",
+        headers=headers
+    )
 
-    context = shipment.model_dump()
-    context["partner"] = shipment.delivery_partner.name
-    context["seller"] = shipment.seller.name
-    context["timeline"] = shipment.timeline
-    context["status"] = shipment.status
 
-    return templates.TemplateResponse(
-        request=request,
-        name="track.html",
-        context=context
+# New timeline events of a shipment as they happen
+@shipment_router.get("/{id}/live", response_model=None)
+async def live_shipment(id: UUID, service: ShipmentServiceDep):
+    return StreamingResponse(
+        await service.live(id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @shipment_router.get("/{id}", response_model=GetShipment)
-async def shipment(id: UUID, service: ShipmentServiceDep):
-
-    shipment = await service.get(id)
-    if not shipment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Given id does not exist"
-        )
-    return shipment
+async def shipment(id: UUID, service: ShipmentServiceDep, if_none_match: Annotated[str | None, Header()] = None):
+    version = await service.get_version(id)
+    etag = _etag(id, version, "detail")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Cached payload is already serialized GetShipment
+    return Response(
+        content=await service.get_payload(id, version),
+        media_type="application/json",
+        headers=headers
+    )
 
 
 # Create a new shipment with
@@ -69,6 +157,16 @@ async def create_shipment(seller: SellerDep, body: CreateShipment, service: Ship
     return {"id": shipment.id}
 
 
+# Create many shipments at once, failures are reported per item
+@shipment_router.post("/bulk", response_model=list[BulkShipmentResult])
+async def create_shipments(
+    seller: SellerDep,
+    body: Annotated[list[CreateShipment], Body(min_length=1, max_length=1000)],
+    service: ShipmentServiceDep,
+):
+    return await service.add_many(body, seller)
+
+
 # Update
 @shipment_router.patch("/", response_model=GetShipment)
 async def update_shipment(id: UUID, shipment_update: UpdateShipment, partner: DeliveryPartnerDep, service: ShipmentServiceDep):
@@ -84,6 +182,37 @@ async def update_shipment(id: UUID, shipment_update: UpdateShipment, partner: De
     return shipment
 
 
+# Scan updates for a batch of shipments, failures are reported per item
+@shipment_router.patch("/bulk", response_model=list[BulkShipmentResult])
+async def update_shipments(body: BulkUpdateShipment, partner: DeliveryPartnerDep, service: ShipmentServiceDep):
+    return await service.update_many(body.updates(), partner)
+
+
+# Scanner location pings, one LocationPing JSON object per line
+@shipment_router.post("/pings", response_model=PingIngestResult)
+async def ingest_pings(request: Request, partner: DeliveryPartnerDep, service: ShipmentServiceDep):
+    pings = []
+    errors = []
+    # Parsed while the body streams in, an oversized batch is
+    # turned away without reading the rest of it
+    async for index, line in _lines(request.stream()):
+        if not line.strip():
+            continue
+        if len(pings) + len(errors) >= 10_000:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="At most 10000 pings can be sent at once"
+            )
+        try:
+            pings.append((index, LocationPing.model_validate_json(line)))
+        except ValidationError as error:
+            errors.append(BulkShipmentResult(index=index, error=str(error)))
+
+    result = await service.ingest_pings(pings, partner) if pings else PingIngestResult()
+    result.errors = sorted(errors + result.errors, key=lambda error: error.index)
+    return result
+
+
 @shipment_router.post("/cancel", response_model=GetShipment)
 async def cancel_shipment(id: UUID, seller: SellerDep, service: ShipmentServiceDep):
 
@@ -102,23 +231,12 @@ async def review_shipment(token: str, review_data: ShipmentReview, service: Ship
 
 # Add tag to shipment
 @shipment_router.post("/tag", response_model=GetShipment)
-async def add_tag_to_shipment(id: UUID, tag: str, service: ShipmentServiceDep):
+async def add_tag_to_shipment(id: UUID, tag: TagNames, service: ShipmentServiceDep):
     return await service.add_tag(id, tag)
 
 # Remove tag from shipment
 
 
 @shipment_router.delete("/tag", response_model=GetShipment)
-async def remove_tag_from_shipment(id: UUID, tag: str, service: ShipmentServiceDep):
-    return await service.remove_tag(id, tag)
-
-
-@shipment_router.get("/tagged", response_model=list[GetShipment])
-async def get_shipments_by_tag(tag_name: TagNames, session: SessionDep):
-    tags = await tag_name.tag(session)
-    if not tags:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No shipments found with the given tag"
-        )
-    return tags.shipments
+async def remove_tag_from_shipment(id: UUID, tag: TagNames, service: ShipmentServiceDep):
+    return await service.delete_tag(id, tag)
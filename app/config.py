@@ -15,6 +15,14 @@ class AppSettings(BaseSettings):
     APP_VERSION: str = "0.1.0"
     APP_DOMAIN: str = "localhost:8000"
     OPENAI_API_KEY: str = ""
+    # first_available, least_loaded or weighted, see app.services.assignment
+    ASSIGNMENT_STRATEGY: str = "least_loaded"
+    # Seconds single shipment assignments are collected to be solved
+    # as one batch. Off by default, requests reserve their own slot.
+    ASSIGNMENT_BATCH_WINDOW: float = 0
+    # Processes running bcrypt and how many callers may queue for them
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_WAITING: int = 100
 
     model_config = _base_config
 
@@ -44,7 +44,7 @@ class InvalidToken(FastShipError):
 
 
 class DeliveryPartnerNotAvailable(FastShipError):
-    """Delivery partner/s do not service the destination"""
+    """No delivery partner available for this shipment"""
 
     status = status.HTTP_406_NOT_ACCEPTABLE
 
@@ -55,6 +55,16 @@ class DeliveryPartnerCapacityExceeded(FastShipError):
     status = status.HTTP_406_NOT_ACCEPTABLE
 
 
+class InvalidCursor(FastShipError):
+    """Pagination cursor is invalid"""
+
+
+class PasswordCheckBusy(FastShipError):
+    """Too many sign ins in progress, try again shortly"""
+
+    status = status.HTTP_503_SERVICE_UNAVAILABLE
+
+
 def _get_handler(status: int, detail: str):
     # Define
     def handler(request: Request, exception: Exception) -> Response:
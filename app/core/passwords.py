@@ -0,0 +1,93 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+from app.config import app_settings
+from app.core.exceptions import PasswordCheckBusy
+
+password_context = CryptContext(schemes=["bcrypt"])
+
+
+def _hash(password: str) -> str:
+    return password_context.hash(password)
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    return password_context.verify(password, password_hash)
+
+
+class PasswordHasher:
+    """bcrypt off the event loop
+
+    Hashes and checks run in a small process pool, at most workers
+    at a time. Callers past that wait their turn, and once max_waiting
+    are queued new ones are turned away with a 503 instead of piling
+    up behind a login burst.
+    """
+
+    def __init__(
+        self,
+        workers: int = app_settings.PASSWORD_HASH_WORKERS,
+        max_waiting: int = app_settings.PASSWORD_HASH_MAX_WAITING,
+    ):
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.running = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(workers)
+        self._pool: ProcessPoolExecutor | None = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._run(_verify, password, password_hash)
+
+    async def _run(self, function, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PasswordCheckBusy()
+
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            if self._pool is None:
+                # Spawned workers don't inherit the event loop's threads
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"))
+            result = await asyncio.get_running_loop().run_in_executor(self._pool, function, *args)
+            self.completed += 1
+            return result
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    async def shutdown(self):
+        # Joining the workers blocks, keep it off the event loop
+        pool, self._pool = self._pool, None
+        if pool:
+            await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from contextlib import suppress
+from time import monotonic, time
+
+from fastapi import HTTPException, status
+
+from app.database.redis import (
+    TOKEN_BLACKLIST_CHANNEL,
+    add_jti_to_blacklist,
+    get_blacklisted_jtis,
+    is_jti_blacklisted,
+    token_blacklist_pubsub,
+)
+from app.utils import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+# Longest access token lifetime, see generate_access_token
+MAX_TOKEN_AGE = 24 * 60 * 60
+
+
+class TokenValidator:
+    """Access token checks without a network call
+
+    Decoded tokens are kept in a bounded LRU keyed by the token's
+    hash. Blacklisted jtis are mirrored in process from redis and kept
+    fresh through pub/sub, and re-read every resync_every seconds in
+    case a message was lost. While the subscription is down the mirror
+    may miss revocations, so redis is asked directly until it's back.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 10_000,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+        prune_every: float = 60,
+        resync_every: float = 300,
+    ):
+        self.max_tokens = max_tokens
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.prune_every = prune_every
+        self.resync_every = resync_every
+        self._tokens: OrderedDict[bytes, dict] = OrderedDict()
+        self._revoked: dict[str, int] = {}
+        self._synced = False
+        self._synced_at = monotonic()
+        self._pruned_at = monotonic()
+        self._task: asyncio.Task | None = None
+
+    def decode(self, token: str) -> dict | None:
+        key = hashlib.sha256(token.encode()).digest()
+        data = self._tokens.get(key)
+        if data is None:
+            data = decode_access_token(token)
+            if data is None:
+                return None
+            self._tokens[key] = data
+            if len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+        else:
+            self._tokens.move_to_end(key)
+            if data["exp"] <= time():
+                del self._tokens[key]
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Access token has expired"
+                )
+        return data
+
+    async def is_revoked(self, data: dict) -> bool:
+        if not self._synced:
+            return await is_jti_blacklisted(data["jti"])
+        return data["jti"] in self._revoked
+
+    async def revoke(self, data: dict):
+        self._revoked[data["jti"]] = data["exp"]
+        await add_jti_to_blacklist(data["jti"], data["exp"])
+
+    def start(self):
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._synced = False
+
+    async def _listen(self):
+        delay = self.retry_delay
+        while True:
+            pubsub = token_blacklist_pubsub()
+            try:
+                # Subscribe before the snapshot so nothing
+                # revoked in between is missed
+                await pubsub.subscribe(TOKEN_BLACKLIST_CHANNEL)
+                await self._resync()
+                delay = self.retry_delay
+                while True:
+                    # Wakes up now and then even when idle, for the
+                    # connection health check and the resync
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message:
+                        jti, _, exp = message["data"].partition("|")
+                        self._revoked[jti] = int(exp)
+                    if monotonic() - self._synced_at > self.resync_every:
+                        await self._resync()
+                    self._prune()
+            except Exception:
+                logger.warning("Token blacklist subscription lost, checking redis directly", exc_info=True)
+            finally:
+                self._synced = False
+                with suppress(Exception):
+                    await pubsub.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    async def _resync(self):
+        self._revoked.update(await get_blacklisted_jtis(MAX_TOKEN_AGE))
+        self._synced = True
+        self._synced_at = monotonic()
+
+    def _prune(self):
+        # Expired tokens fail decoding anyway
+        if monotonic() - self._pruned_at < self.prune_every:
+            return
+        now = time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._pruned_at = monotonic()
+
+
+token_validator = TokenValidator()
@@ -0,0 +1,47 @@
+from enum import Enum
+
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from app.database.models import Shipment
+
+
+class LoadProfile(str, Enum):
+    """Named relationship loading strategies
+
+    Relationships are lazy and raise on implicit SQL, so every query
+    has to pick the graph it needs with one of these profiles.
+    """
+    # Authenticated seller or partner, own columns only
+    principal = "principal"
+    # Everything GetShipment serializes
+    shipment_detail = "shipment_detail"
+    # Listing row with seller and partner, no collections
+    list_row = "list_row"
+    # Public tracking page and notifications
+    tracking = "tracking"
+
+
+_profiles = {
+    LoadProfile.principal: (
+        raiseload("*"),
+    ),
+    LoadProfile.shipment_detail: (
+        selectinload(Shipment.live_timeline),
+        selectinload(Shipment.tags),
+        joinedload(Shipment.seller),
+        joinedload(Shipment.delivery_partner),
+    ),
+    LoadProfile.list_row: (
+        joinedload(Shipment.seller),
+        joinedload(Shipment.delivery_partner),
+    ),
+    LoadProfile.tracking: (
+        selectinload(Shipment.live_timeline),
+        joinedload(Shipment.seller),
+        joinedload(Shipment.delivery_partner),
+    ),
+}
+
+
+def load_options(profile: LoadProfile) -> tuple:
+    return _profiles[profile]
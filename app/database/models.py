@@ -2,23 +2,64 @@ from datetime import datetime
 from uuid import UUID, uuid4
 from pydantic import EmailStr
 from sqlmodel import Field, Relationship, SQLModel, Column
+from sqlalchemy import BigInteger, Index, inspect, text
+from sqlalchemy.orm.base import NO_VALUE
 from app.schemas.enums import ShipmentStatus, TagNames
 from sqlalchemy.dialects import postgresql
 
 
-class ShipmentEvent(SQLModel, table=True):
-    __tablename__ = "shipment_events"
-    id: UUID = Field(sa_column=Column(
-        type_=postgresql.UUID, primary_key=True, default=uuid4))
-    created_at: datetime = Field(sa_column=Column(
-        postgresql.TIMESTAMP(), default=datetime.now))
+class ShipmentEventBase(SQLModel):
     location: int
     status: ShipmentStatus
     description: str | None = Field(default=None)
     shipment_id: UUID = Field(foreign_key="shipments.id")
 
-    shipment: "Shipment" = Relationship(back_populates="timeline",
-                                        sa_relationship_kwargs={"lazy": "selectin"})
+
+class ShipmentEvent(ShipmentEventBase, table=True):
+    __tablename__ = "shipment_events"
+    __table_args__ = (
+        Index("ix_shipment_events_shipment_id_created_at",
+              "shipment_id", "created_at"),
+        # Monthly partitions, see ShipmentEventArchiveService.ensure_partitions
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # The partition key has to be part of the primary key
+    id: UUID = Field(sa_column=Column(
+        type_=postgresql.UUID, primary_key=True, default=uuid4))
+    created_at: datetime = Field(sa_column=Column(
+        postgresql.TIMESTAMP(), primary_key=True, default=datetime.now))
+
+    shipment: "Shipment" = Relationship(back_populates="live_timeline",
+                                        sa_relationship_kwargs={"lazy": "raise_on_sql"})
+
+
+class ShipmentEventArchive(ShipmentEventBase, table=True):
+    # Events of shipments closed long ago, moved out of the hot
+    # partitions by ShipmentEventArchiveService.archive_closed
+    __tablename__ = "shipment_events_archive"
+
+    id: UUID = Field(sa_column=Column(
+        type_=postgresql.UUID, primary_key=True))
+    created_at: datetime = Field(sa_column=Column(postgresql.TIMESTAMP()))
+    shipment_id: UUID = Field(foreign_key="shipments.id", index=True)
+
+
+class ShipmentPing(SQLModel, table=True):
+    # Location reported by a partner scanner, written in batches
+    # by PingBuffer, status changes become ShipmentEvents instead
+    __tablename__ = "shipment_pings"
+    __table_args__ = (
+        Index("ix_shipment_pings_shipment_id_created_at",
+              "shipment_id", "created_at"),
+    )
+
+    id: int | None = Field(default=None, sa_column=Column(
+        BigInteger, primary_key=True, autoincrement=True))
+    shipment_id: UUID = Field(foreign_key="shipments.id")
+    location: int
+    created_at: datetime = Field(sa_column=Column(
+        postgresql.TIMESTAMP(), nullable=False, default=datetime.now))
 
 
 class ShipmentTag(SQLModel, table=True):
@@ -28,8 +69,48 @@ class ShipmentTag(SQLModel, table=True):
     tag_id: UUID = Field(foreign_key="tags.id", primary_key=True)
 
 
+class ShipmentStatusCount(SQLModel, table=True):
+    # Shipments per status of a seller or partner, kept up to date
+    # by ShipmentEventService in the same transaction as each event
+    __tablename__ = "shipment_status_counts"
+
+    # "seller" or "partner", same as the access token role claim
+    owner: str = Field(primary_key=True)
+    owner_id: UUID = Field(primary_key=True)
+    status: ShipmentStatus = Field(primary_key=True)
+    count: int = Field(default=0)
+
+
+class DeliveryEstimate(SQLModel, table=True):
+    # Median transit time of a lane per partner, rebuilt nightly
+    # from shipment event history by DeliveryEstimateService
+    __tablename__ = "delivery_estimates"
+
+    origin: int = Field(primary_key=True)
+    destination: int = Field(primary_key=True)
+    delivery_partner_id: UUID = Field(primary_key=True)
+    transit_seconds: int
+    samples: int
+
+
 class Shipment(SQLModel, table=True):
     __tablename__ = "shipments"
+    __table_args__ = (
+        # Keyset pagination of shipment listings
+        Index("ix_shipments_created_at_id", "created_at", "id"),
+        # Search filters, see ShipmentService._list_query
+        Index("ix_shipments_seller_id_created_at", "seller_id", "created_at"),
+        Index("ix_shipments_delivery_partner_id_current_status",
+              "delivery_partner_id", "current_status"),
+        Index("ix_shipments_destination", "destination"),
+        Index("ix_shipments_estimated_delivery", "estimated_delivery"),
+        # Partner manifest, covers the whole query for active shipments
+        Index("ix_shipments_partner_manifest",
+              "delivery_partner_id", "destination", "created_at",
+              postgresql_include=["id", "current_status", "current_location",
+                                  "estimated_delivery", "content", "weight"],
+              postgresql_where=text("current_status NOT IN ('delivered', 'cancelled')")),
+    )
 
     id: UUID = Field(sa_column=Column(
         type_=postgresql.UUID, primary_key=True, default=uuid4))
@@ -42,30 +123,56 @@ class Shipment(SQLModel, table=True):
 
     seller_id: UUID = Field(foreign_key="sellers.id")
     seller: "Seller" = Relationship(
-        back_populates="shipments", sa_relationship_kwargs={"lazy": "selectin"})
+        back_populates="shipments", sa_relationship_kwargs={"lazy": "raise_on_sql"})
     delivery_partner_id: UUID | None = Field(
         foreign_key="delivery_partners.id")
     delivery_partner: "DeliveryPartner" = Relationship(
-        back_populates="shipments", sa_relationship_kwargs={"lazy": "selectin"})
+        back_populates="shipments", sa_relationship_kwargs={"lazy": "raise_on_sql"})
     created_at: datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP(), default=datetime.now
     ))
 
-    timeline: list["ShipmentEvent"] = Relationship(back_populates="shipment",
-                                                   sa_relationship_kwargs={"lazy": "selectin"})
+    # Copied from the latest event by ShipmentEventService.add
+    current_status: ShipmentStatus | None = Field(default=None, index=True)
+    current_location: int | None = Field(default=None)
+    # Bumped on every change to the shipment's public representation
+    version: int = Field(default=1)
+
+    # Set once the events have been moved to shipment_events_archive
+    events_archived: bool = Field(default=False)
+
+    live_timeline: list["ShipmentEvent"] = Relationship(back_populates="shipment",
+                                                        sa_relationship_kwargs={"lazy": "raise_on_sql",
+                                                                                "order_by": "ShipmentEvent.created_at"})
+    # Only loaded for archived shipments, see ShipmentService.get
+    archived_timeline: list["ShipmentEventArchive"] = Relationship(
+        sa_relationship_kwargs={"lazy": "raise_on_sql",
+                                "viewonly": True,
+                                "order_by": "ShipmentEventArchive.created_at"})
 
     review: "Review" = Relationship(
-        back_populates="shipment", sa_relationship_kwargs={"lazy": "selectin"})
+        back_populates="shipment", sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
     tags: list["Tag"] = Relationship(
         back_populates="shipments",
         link_model=ShipmentTag,
-        sa_relationship_kwargs={"lazy": "immediate"}
+        sa_relationship_kwargs={"lazy": "raise_on_sql"}
     )
 
+    @property
+    def timeline(self) -> list[ShipmentEventBase]:
+        archived = inspect(self).attrs.archived_timeline.loaded_value
+        if archived is NO_VALUE:
+            return self.live_timeline
+        return [*archived, *self.live_timeline]
+
     @property
     def status(self):
-        return self.timeline[-1].status if len(self.timeline) > 0 else None
+        return self.current_status
+
+    def bump_version(self):
+        # Incremented in the UPDATE itself so concurrent bumps aren't lost
+        self.version = Shipment.version + 1
 
     # Seter for status to create a new event when status is updated
     # @status.setter
@@ -85,7 +192,7 @@ class Tag(SQLModel, table=True):
     shipments: list["Shipment"] = Relationship(
         back_populates="tags",
         link_model=ShipmentTag,
-        sa_relationship_kwargs={"lazy": "immediate"}
+        sa_relationship_kwargs={"lazy": "raise_on_sql"}
     )
 
 
@@ -103,7 +210,7 @@ class Seller(User, table=True):
         type_=postgresql.UUID, primary_key=True, default=uuid4))
 
     shipments: list[Shipment] = Relationship(back_populates="seller",
-                                             sa_relationship_kwargs={"lazy": "selectin"})
+                                             sa_relationship_kwargs={"lazy": "raise_on_sql"})
     created_at: datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP(), default=datetime.now
     ))
@@ -112,6 +219,40 @@ class Seller(User, table=True):
     zip_code: int | None = Field(default=None)
 
 
+class WebhookSubscription(SQLModel, table=True):
+    __tablename__ = "webhook_subscriptions"
+
+    id: UUID = Field(sa_column=Column(
+        type_=postgresql.UUID, primary_key=True, default=uuid4))
+    seller_id: UUID = Field(foreign_key="sellers.id", index=True)
+    url: str
+    # Shared with the seller once, signs every delivery
+    secret: str
+    active: bool = Field(default=True)
+    created_at: datetime = Field(sa_column=Column(
+        postgresql.TIMESTAMP(), default=datetime.now
+    ))
+
+
+class WebhookEvent(SQLModel, table=True):
+    # Outbox of events waiting for the next batch to a seller,
+    # written in the same transaction as the shipment event
+    __tablename__ = "webhook_events"
+    __table_args__ = (
+        Index("ix_webhook_events_seller_id_id", "seller_id", "id"),
+    )
+
+    id: int | None = Field(default=None, sa_column=Column(
+        BigInteger, primary_key=True, autoincrement=True))
+    seller_id: UUID = Field(foreign_key="sellers.id")
+    # Serialized ShipmentEventRead
+    payload: str
+    # Set while a dispatch delivers the event, which is deleted once
+    # its deliveries are queued. Expired claims are taken again.
+    claimed_at: datetime | None = Field(default=None, sa_column=Column(
+        postgresql.TIMESTAMP(), nullable=True))
+
+
 class DeliveryPartner(User, table=True):
     __tablename__ = "delivery_partners"
 
@@ -120,20 +261,19 @@ class DeliveryPartner(User, table=True):
     serviceable_zipcodes: list[int] = Field(
         sa_column=Column(postgresql.ARRAY(postgresql.INTEGER)))
     max_handling_capacity: int
+    # Kept in step with assignments and status changes,
+    # see DeliveryPartnerService.reconcile_capacity for repairs
+    active_shipment_count: int = Field(default=0)
 
     shipments: list[Shipment] = Relationship(back_populates="delivery_partner",
-                                             sa_relationship_kwargs={"lazy": "selectin"})
+                                             sa_relationship_kwargs={"lazy": "raise_on_sql"})
     created_at: datetime = Field(sa_column=Column(
         postgresql.TIMESTAMP(), default=datetime.now
     ))
 
-    @property
-    def active_shipments(self):
-        return [shipment for shipment in self.shipments if shipment.status != ShipmentStatus.delivered and shipment.status != ShipmentStatus.cancelled]
-
     @property
     def current_handling_capacity(self):
-        return self.max_handling_capacity - len(self.active_shipments)
+        return self.max_handling_capacity - self.active_shipment_count
 
 
 class Review(SQLModel, table=True):
@@ -150,7 +290,7 @@ class Review(SQLModel, table=True):
     shipment_id: UUID = Field(foreign_key="shipments.id")
     shipment: Shipment = Relationship(
         back_populates="review",
-        sa_relationship_kwargs={"lazy": "selectin"})
+        sa_relationship_kwargs={"lazy": "raise_on_sql"})
 
 
 class ChatSession(SQLModel, table=True):
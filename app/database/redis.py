@@ -1,5 +1,6 @@
 from uuid import UUID
 from redis.asyncio import Redis
+from redis.asyncio.client import PubSub
 
 from app.config import settings
 
@@ -9,9 +10,15 @@ _token_blacklist = Redis(
     decode_responses=True,
     username=settings.REDIS_USER,
     password=settings.REDIS_PASSWORD,
-    db=0
+    db=0,
+    # Pings idle connections, a dead blacklist subscription
+    # is noticed instead of waiting forever
+    health_check_interval=30,
 )
 
+# Revoked tokens are also announced here, see app.core.tokens
+TOKEN_BLACKLIST_CHANNEL = "token_blacklist"
+
 _shipment_verification_codes = Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
@@ -21,18 +28,150 @@ _shipment_verification_codes = Redis(
     db=1
 )
 
+_shipment_cache = Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True,
+    username=settings.REDIS_USER,
+    password=settings.REDIS_PASSWORD,
+    db=2
+)
+
+# Pub/sub only, channels aren't scoped to a db
+_shipment_events = Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True,
+    username=settings.REDIS_USER,
+    password=settings.REDIS_PASSWORD,
+    db=3
+)
+
+SHIPMENT_EVENTS_CHANNEL = "shipment_events"
 
-async def add_jti_to_blacklist(jti: str):
-    await _token_blacklist.set(jti, "blacklisted")
+# Webhook batch scheduling, and the delivery limits in app.worker.webhooks
+_webhooks = Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    decode_responses=True,
+    username=settings.REDIS_USER,
+    password=settings.REDIS_PASSWORD,
+    db=4
+)
+
+
+async def add_jti_to_blacklist(jti: str, exp: int):
+    # Kept until the token would have expired anyway
+    async with _token_blacklist.pipeline(transaction=False) as pipe:
+        pipe.set(jti, "blacklisted", exat=exp)
+        pipe.publish(TOKEN_BLACKLIST_CHANNEL, f"{jti}|{exp}")
+        await pipe.execute()
 
 
 async def is_jti_blacklisted(jti: str) -> bool:
     return await _token_blacklist.exists(jti)
 
 
+async def get_blacklisted_jtis(max_age: int) -> dict[str, int]:
+    # jti -> expiry timestamp of every blacklisted token. Entries
+    # written without an expiry get max_age, the longest token lifetime.
+    jtis = [jti async for jti in _token_blacklist.scan_iter(count=1000)]
+    if not jtis:
+        return {}
+    async with _token_blacklist.pipeline(transaction=False) as pipe:
+        for jti in jtis:
+            pipe.expire(jti, max_age, nx=True)
+            pipe.expiretime(jti)
+        results = await pipe.execute()
+    return {
+        jti: exp for jti, exp in zip(jtis, results[1::2]) if exp > 0
+    }
+
+
+def token_blacklist_pubsub() -> PubSub:
+    return _token_blacklist.pubsub(ignore_subscribe_messages=True)
+
+
 async def add_shipment_verification_code(shipment_id: UUID, code: int) -> str | None:
     return await _shipment_verification_codes.set(str(shipment_id), code)
 
 
+async def add_shipment_verification_codes(codes: dict[UUID, int]):
+    await _shipment_verification_codes.mset(
+        {str(shipment_id): code for shipment_id, code in codes.items()}
+    )
+
+
 async def get_shipment_verification_code(shipment_id: UUID) -> str | None:
     return await _shipment_verification_codes.get(str(shipment_id))
+
+
+async def get_shipment_verification_codes(shipment_ids: list[UUID]) -> list[str | None]:
+    if not shipment_ids:
+        return []
+    return await _shipment_verification_codes.mget([str(shipment_id) for shipment_id in shipment_ids])
+
+
+async def get_cached_shipment(namespace: str, shipment_id: UUID, count: bool = True) -> str | None:
+    if not count:
+        return await _shipment_cache.get(f"{namespace}:{shipment_id}")
+    # Lookup and request counter in one round trip
+    async with _shipment_cache.pipeline(transaction=False) as pipe:
+        pipe.get(f"{namespace}:{shipment_id}")
+        pipe.hincrby(f"{namespace}:stats", "requests")
+        payload, _ = await pipe.execute()
+    return payload
+
+
+async def set_cached_shipment(namespace: str, shipment_id: UUID, payload: str, ttl: int):
+    await _shipment_cache.set(f"{namespace}:{shipment_id}", payload, ex=ttl)
+
+
+async def delete_cached_shipments(namespaces: list[str], shipment_ids: list[UUID]):
+    keys = [f"{namespace}:{shipment_id}" for namespace in namespaces for shipment_id in shipment_ids]
+    if keys:
+        await _shipment_cache.delete(*keys)
+
+
+async def lock_cached_shipment(namespace: str, shipment_id: UUID, timeout: float) -> bool:
+    return bool(await _shipment_cache.set(
+        f"{namespace}:{shipment_id}:lock", 1, nx=True, px=int(timeout * 1000)
+    ))
+
+
+async def unlock_cached_shipment(namespace: str, shipment_id: UUID):
+    await _shipment_cache.delete(f"{namespace}:{shipment_id}:lock")
+
+
+async def count_shipment_cache_miss(namespace: str):
+    await _shipment_cache.hincrby(f"{namespace}:stats", "misses")
+
+
+async def get_shipment_cache_stats(namespace: str) -> dict[str, int]:
+    stats = await _shipment_cache.hgetall(f"{namespace}:stats")
+    requests = int(stats.get("requests", 0))
+    misses = int(stats.get("misses", 0))
+    return {"requests": requests, "hits": requests - misses, "misses": misses}
+
+
+async def publish_shipment_events(messages: list[str]):
+    async with _shipment_events.pipeline(transaction=False) as pipe:
+        for message in messages:
+            pipe.publish(SHIPMENT_EVENTS_CHANNEL, message)
+        await pipe.execute()
+
+
+def shipment_events_pubsub() -> PubSub:
+    return _shipment_events.pubsub(ignore_subscribe_messages=True)
+
+
+async def schedule_webhook_batches(seller_ids: set[UUID], window: int) -> list[UUID]:
+    # Sellers without a batch pending in the current window
+    seller_ids = list(seller_ids)
+    if not seller_ids:
+        return []
+    async with _webhooks.pipeline(transaction=False) as pipe:
+        for seller_id in seller_ids:
+            pipe.set(f"webhooks:scheduled:{seller_id}", 1, nx=True, ex=window)
+        scheduled = await pipe.execute()
+    return [seller_id for seller_id, new in zip(seller_ids, scheduled) if new]
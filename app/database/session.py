@@ -1,4 +1,5 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import NullPool
 from sqlmodel import SQLModel
 from sqlalchemy.orm import sessionmaker
 
@@ -11,6 +12,14 @@ engine = create_async_engine(
 
 )
 
+# Celery tasks run every call on a new event loop,
+# pooled connections can't be shared between them
+worker_engine = create_async_engine(
+    url=settings.POSTGRES_URL,
+    echo=False,
+    poolclass=NullPool,
+)
+
 
 async def create_db_tables():
     async with engine.begin() as connection:
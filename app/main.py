@@ -5,9 +5,18 @@ from fastapi import FastAPI
 from scalar_fastapi import get_scalar_api_reference
 
 from app.core.exceptions import add_exception_handlers
+from app.core.passwords import password_hasher
+from app.core.tokens import token_validator
 
 
-from .database.session import create_db_tables
+from .database.session import create_db_tables, get_session
+from .services.coverage import coverage_index
+from .services.delivery_estimate import delivery_estimates
+from .services.live import shipment_event_hub
+from .services.ping_buffer import ping_buffer
+from .services.shipment_cache import cache_stats
+from .services.shipment_event_archive import ShipmentEventArchiveService
+from .services.tags import tag_registry
 
 from .api.router import all_routers
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,8 +25,20 @@ from fastapi.middleware.cors import CORSMiddleware
 @asynccontextmanager
 async def lifespan_handler(app: FastAPI):
     await create_db_tables()
+    async for session in get_session():
+        # create_all makes the partitioned table, not its partitions
+        await ShipmentEventArchiveService(session).ensure_partitions()
+        await coverage_index.build(session)
+        await delivery_estimates.load(session)
+        await tag_registry.load(session)
+    ping_buffer.start()
+    token_validator.start()
     print("Server started")
     yield
+    await ping_buffer.stop()
+    await shipment_event_hub.stop()
+    await token_validator.stop()
+    await password_hasher.shutdown()
     print("Server stopped")
 
 
@@ -39,6 +60,18 @@ app.include_router(all_routers)
 add_exception_handlers(app)
 
 
+@app.get("/metrics/passwords", include_in_schema=False)
+def password_metrics():
+    # Queue depth of the bcrypt pool, see PasswordHasher
+    return password_hasher.stats()
+
+
+@app.get("/metrics/shipment-cache", include_in_schema=False)
+async def shipment_cache_metrics():
+    # Requests and misses per shipment cache
+    return await cache_stats()
+
+
 @app.get("/scalar", include_in_schema=False)
 def scalar_docs():
     return get_scalar_api_reference(
@@ -1,7 +1,10 @@
+from datetime import datetime
 from uuid import UUID
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from sqlmodel import Field
 
+from app.schemas.enums import ShipmentStatus
+
 
 class BaseDeliveryPartner(BaseModel):
 
@@ -27,3 +30,19 @@ class UpdateDeliveryPartner(BaseModel):
 
 class CreateDeliveryPartner(BaseDeliveryPartner):
     password: str
+
+
+class ManifestShipment(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    status: ShipmentStatus | None = None
+    location: int | None = None
+    estimated_delivery: datetime
+    content: str
+    weight: float
+
+
+class ManifestStop(BaseModel):
+    destination: int
+    shipments: list[ManifestShipment]
@@ -0,0 +1,83 @@
+"""JSON encoders for the hot shipment read paths
+
+These build the documented response shapes (GetShipment,
+ShipmentListItem, TrackShipment) straight from ORM objects and rows
+with orjson, without validating through pydantic first. Keep them in
+step with the schemas in app.schemas.shipment.
+"""
+from typing import Iterable
+
+import orjson
+from sqlalchemy import Row
+
+from app.database.models import Shipment
+
+
+def _event(event) -> dict:
+    return {
+        "id": event.id,
+        "created_at": event.created_at,
+        "location": event.location,
+        "status": event.status,
+        "description": event.description,
+        "shipment_id": event.shipment_id,
+    }
+
+
+def _track_event(event) -> dict:
+    return {
+        "status": event.status,
+        "location": event.location,
+        "description": event.description,
+        "created_at": event.created_at,
+    }
+
+
+def encode_shipment(shipment: Shipment) -> bytes:
+    # GetShipment
+    seller = shipment.seller
+    partner = shipment.delivery_partner
+    return orjson.dumps({
+        "content": shipment.content,
+        "weight": shipment.weight,
+        "destination": shipment.destination,
+        "id": shipment.id,
+        "status": shipment.status,
+        "timeline": [_event(event) for event in shipment.timeline],
+        "estimated_delivery": shipment.estimated_delivery,
+        "seller": {
+            "name": seller.name,
+            "email": seller.email,
+            "id": seller.id,
+            "zip_code": seller.zip_code,
+        },
+        "tags": [{"name": tag.name, "instruction": tag.instruction} for tag in shipment.tags],
+        "delivery_partner": {"id": partner.id, "name": partner.name} if partner else None,
+    })
+
+
+def encode_tracking(shipment: Shipment) -> bytes:
+    # TrackShipment
+    return orjson.dumps({
+        "id": shipment.id,
+        "content": shipment.content,
+        "status": shipment.status,
+        "seller": shipment.seller.name,
+        "partner": shipment.delivery_partner.name if shipment.delivery_partner else None,
+        "created_at": shipment.created_at,
+        "estimated_delivery": shipment.estimated_delivery,
+        "timeline": [_track_event(event) for event in shipment.timeline],
+    })
+
+
+def encode_list_row(row: Row) -> bytes:
+    # ShipmentListItem, rows of ShipmentService._list_query
+    return orjson.dumps(row._asdict())
+
+
+def encode_page(rows: Iterable[Row], next_cursor: str | None) -> bytes:
+    # ShipmentPage
+    return orjson.dumps({
+        "items": [row._asdict() for row in rows],
+        "next_cursor": next_cursor,
+    })
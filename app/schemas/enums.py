@@ -11,6 +11,17 @@ class ShipmentStatus(str, Enum):
     cancelled = "cancelled"
 
 
+# Shipments in these states no longer count towards a partner's load
+CLOSED_STATUSES = (ShipmentStatus.delivered, ShipmentStatus.cancelled)
+
+
+class ShipmentSort(str, Enum):
+    newest = "newest"
+    oldest = "oldest"
+    # Soonest estimated delivery first
+    eta = "eta"
+
+
 class TagNames(str, Enum):
     FRAGILE = "fragile"
     PERISHABLE = "perishable"
@@ -0,0 +1,14 @@
+from uuid import UUID
+from pydantic import BaseModel, ConfigDict
+
+
+class Principal(BaseModel):
+    # Authenticated seller or partner, the columns endpoints
+    # need without loading the whole entity
+    model_config = ConfigDict(frozen=True)
+
+    id: UUID
+    name: str
+    email_verified: bool
+    # Sellers only, where their shipments are placed from
+    zip_code: int | None = None
@@ -1,13 +1,11 @@
 from datetime import datetime
 from random import randint
+from typing import Literal
 from uuid import UUID
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, model_validator
 
-
-from app.database.models import ShipmentEvent
 from app.schemas.seller import ReadSeller
-from app.schemas.delivery_partner import ReadDeliveryPartner
-from app.schemas.enums import ShipmentStatus, TagNames
+from app.schemas.enums import ShipmentSort, ShipmentStatus, TagNames
 
 
 def random_destination():
@@ -31,14 +29,99 @@ class TagRead(BaseModel):
     instruction: str
 
 
+class ShipmentEventRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    created_at: datetime | None = None
+    location: int
+    status: ShipmentStatus
+    description: str | None = None
+    shipment_id: UUID
+
+
+class ShipmentPartner(BaseModel):
+    # Partner summary, the full profile carries every serviceable zipcode
+    id: UUID
+    name: str
+
+
 class GetShipment(BaseShipment):
     id: UUID
     status: ShipmentStatus
-    timeline: list[ShipmentEvent]
+    timeline: list[ShipmentEventRead]
     estimated_delivery: datetime
     seller: ReadSeller
     tags: list[TagRead]
-    delivery_partner: ReadDeliveryPartner | None = None
+    delivery_partner: ShipmentPartner | None = None
+
+
+class ShipmentListItem(BaseShipment):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: UUID
+    status: ShipmentStatus | None = None
+    estimated_delivery: datetime
+    created_at: datetime | None = None
+    seller_id: UUID
+    delivery_partner_id: UUID | None = None
+
+
+class ShipmentPage(BaseModel):
+    items: list[ShipmentListItem]
+    next_cursor: str | None = None
+
+
+class ShipmentSearch(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    status: list[ShipmentStatus] = Field(default_factory=list)
+    destination: int | None = None
+    delivery_partner_id: UUID | None = None
+    tag: list[TagNames] = Field(default_factory=list)
+    match: Literal["any", "all"] = "any"
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    eta_after: datetime | None = None
+    eta_before: datetime | None = None
+    sort: ShipmentSort = ShipmentSort.newest
+    cursor: str | None = None
+    limit: int = Field(default=50, ge=1, le=100)
+
+    @model_validator(mode="after")
+    def check_ranges(self):
+        if self.created_after and self.created_before and self.created_after > self.created_before:
+            raise ValueError("created_after must be before created_before")
+        if self.eta_after and self.eta_before and self.eta_after > self.eta_before:
+            raise ValueError("eta_after must be before eta_before")
+        return self
+
+
+class ShipmentStats(BaseModel):
+    counts: dict[ShipmentStatus, int]
+    total: int
+    # Shipments not yet delivered or cancelled
+    active: int
+
+
+class TrackEvent(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    status: ShipmentStatus
+    location: int
+    description: str | None = None
+    created_at: datetime | None = None
+
+
+class TrackShipment(BaseModel):
+    id: UUID
+    content: str
+    status: ShipmentStatus | None = None
+    seller: str
+    partner: str | None = None
+    created_at: datetime | None = None
+    estimated_delivery: datetime
+    timeline: list[TrackEvent]
 
 
 class CreateShipment(BaseShipment):
@@ -46,6 +129,13 @@ class CreateShipment(BaseShipment):
     client_contact_phone: str | None = Field(default=None)
 
 
+class BulkShipmentResult(BaseModel):
+    # Position of the shipment in the request body
+    index: int
+    id: UUID | None = None
+    error: str | None = None
+
+
 class UpdateShipment(BaseModel):
     location: int | None = Field(default=None)
     status: ShipmentStatus | None = Field(default=None)
@@ -54,6 +144,49 @@ class UpdateShipment(BaseModel):
     estimated_delivery: datetime | None = Field(default=None)
 
 
+class ShipmentUpdateItem(UpdateShipment):
+    id: UUID
+
+
+class BulkUpdateShipment(BaseModel):
+    # The same update applied to every id...
+    ids: list[UUID] = Field(default_factory=list)
+    update: UpdateShipment | None = Field(default=None)
+    # ...and/or updates with their own values
+    items: list[ShipmentUpdateItem] = Field(default_factory=list)
+
+    @model_validator(mode="after")
+    def check_updates(self):
+        if self.ids and self.update is None:
+            raise ValueError("update is required with ids")
+        if not 0 < len(self.ids) + len(self.items) <= 1000:
+            raise ValueError("between 1 and 1000 shipments can be updated at once")
+        return self
+
+    def updates(self) -> list[tuple[UUID, UpdateShipment]]:
+        # ids first, then items, result indexes follow this order
+        return [(id, self.update) for id in self.ids] + [
+            (item.id, item) for item in self.items
+        ]
+
+
+class LocationPing(BaseModel):
+    # One NDJSON line of a scanner upload
+    id: UUID
+    location: int
+    # Only set when the scan changes the status
+    status: ShipmentStatus | None = None
+    verification_code: int | None = None
+    at: datetime | None = None
+
+
+class PingIngestResult(BaseModel):
+    accepted: int = 0
+    duplicates: int = 0
+    events: int = 0
+    errors: list[BulkShipmentResult] = Field(default_factory=list)
+
+
 class ShipmentReview(BaseModel):
     rating: int = Field(ge=1, le=5)
     comment: str | None = Field(default=None, max_length=250)
@@ -0,0 +1,19 @@
+from datetime import datetime
+from uuid import UUID
+from pydantic import AnyHttpUrl, BaseModel
+
+
+class CreateWebhook(BaseModel):
+    url: AnyHttpUrl
+
+
+class ReadWebhook(BaseModel):
+    id: UUID
+    url: str
+    active: bool
+    created_at: datetime
+
+
+class CreatedWebhook(ReadWebhook):
+    # Only returned on creation
+    secret: str
@@ -0,0 +1,128 @@
+import numpy as np
+from sqlalchemy import func
+
+from app.config import app_settings
+from app.database.models import DeliveryPartner
+
+_rng = np.random.default_rng()
+
+
+class AssignmentStrategy:
+    """Ranks the delivery partners covering a destination
+
+    order_by ranks candidates in SQL when a single shipment reserves
+    a slot, cost scores every partner column of a batch at once for
+    solve. Lower is better for both.
+    """
+    name: str
+
+    def order_by(self) -> tuple:
+        raise NotImplementedError
+
+    def cost(self, load: np.ndarray, capacity: np.ndarray, rows: int) -> np.ndarray:
+        # Per partner, or per shipment and partner, broadcast to rows
+        raise NotImplementedError
+
+
+class FirstAvailable(AssignmentStrategy):
+    # Previous behaviour, fills one partner before the next
+    name = "first_available"
+
+    def order_by(self) -> tuple:
+        return (DeliveryPartner.id,)
+
+    def cost(self, load, capacity, rows):
+        # Partner columns are in id order
+        return np.arange(len(load), dtype=np.float64)
+
+
+class LeastLoaded(AssignmentStrategy):
+    # Lowest share of capacity in use first
+    name = "least_loaded"
+
+    def order_by(self) -> tuple:
+        return (
+            DeliveryPartner.active_shipment_count * 1.0 / DeliveryPartner.max_handling_capacity,
+            DeliveryPartner.id,
+        )
+
+    def cost(self, load, capacity, rows):
+        return (load + 1) / capacity
+
+
+class Weighted(AssignmentStrategy):
+    # Random partner, weighted by free slots. Concurrent requests
+    # spread over partners instead of all going for the same one.
+    name = "weighted"
+
+    def order_by(self) -> tuple:
+        # Weighted random order, -ln(u) / weight (Efraimidis-Spirakis)
+        spare = DeliveryPartner.max_handling_capacity - DeliveryPartner.active_shipment_count
+        return (-func.ln(func.random()) / spare,)
+
+    def cost(self, load, capacity, rows):
+        spare = np.maximum(capacity - load, 1)
+        return _rng.exponential(size=(rows, len(load))) / spare
+
+
+strategies: dict[str, AssignmentStrategy] = {
+    strategy.name: strategy for strategy in (FirstAvailable(), LeastLoaded(), Weighted())
+}
+
+
+def get_strategy(name: str | None = None) -> AssignmentStrategy:
+    return strategies[name or app_settings.ASSIGNMENT_STRATEGY]
+
+
+def solve(
+    eligible: np.ndarray,
+    load: np.ndarray,
+    capacity: np.ndarray,
+    strategy: AssignmentStrategy,
+) -> np.ndarray:
+    """Assigns a batch of shipments to partners
+
+    eligible is the shipments x partners coverage matrix, load and
+    capacity are per partner. Each round every pending shipment bids
+    for its cheapest partner with room and every partner accepts its
+    fair share of the shipments it could take, those with fewer
+    options first. Returns the partner column of each shipment, -1
+    where none is left.
+    """
+    assigned = np.full(eligible.shape[0], -1)
+
+    # Only partners covering some shipment take part
+    used = np.flatnonzero(eligible.any(axis=0))
+    if not used.size:
+        return assigned
+    eligible = eligible[:, used]
+    load = load[used].astype(np.float64)
+    capacity = capacity[used].astype(np.float64)
+    options = eligible.sum(axis=1)
+
+    while True:
+        pending = np.flatnonzero(assigned < 0)
+        feasible = eligible[pending] & (load < capacity)
+        bidding = feasible.any(axis=1)
+        if not bidding.any():
+            break
+        pending, feasible = pending[bidding], feasible[bidding]
+
+        cost = np.where(feasible, strategy.cost(load, capacity, len(pending)), np.inf)
+        choice = cost.argmin(axis=1)
+
+        # Every shipment is split evenly over the partners it could
+        # go to, a partner's share is the sum of its parts
+        share = np.ceil((feasible / feasible.sum(axis=1, keepdims=True)).sum(axis=0))
+
+        # Rank the bids on each partner, the first bid always fits
+        order = np.lexsort((options[pending], choice))
+        bidders, choice = pending[order], choice[order]
+        rank = np.arange(len(choice)) - np.searchsorted(choice, choice)
+        accepted = rank < np.minimum(share, capacity - load)[choice]
+
+        assigned[bidders[accepted]] = choice[accepted]
+        load += np.bincount(choice[accepted], minlength=len(used))
+
+    # Back to the caller's columns
+    return np.where(assigned >= 0, used[np.maximum(assigned, 0)], -1)
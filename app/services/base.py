@@ -2,14 +2,23 @@ from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import SQLModel
 
+from app.database.loaders import LoadProfile, load_options
+
 
 class BaseService:
     def __init__(self, model: SQLModel, session: AsyncSession):
         self.session = session
         self.model = model
 
-    async def _get(self, id: UUID):
-        return await self.session.get(self.model, id)
+    async def _get(self, id: UUID, profile: LoadProfile | None = None):
+        if profile is None:
+            return await self.session.get(self.model, id)
+        # Reload even if already in the session, so the profile is applied
+        return await self.session.get(
+            self.model, id,
+            options=load_options(profile),
+            populate_existing=True
+        )
 
     async def _add(self, entity: SQLModel):
         self.session.add(entity)
@@ -0,0 +1,72 @@
+import asyncio
+from array import array
+from time import monotonic
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import DeliveryPartner
+
+
+class CoverageIndex:
+    """Process local zipcode -> delivery partners lookup
+
+    Partners are numbered with dense slots and every zipcode keeps
+    a sorted array of the slots serving it. The index is rebuilt from
+    DeliveryPartner.serviceable_zipcodes when invalidated or older than
+    max_age seconds. Invalidation only reaches this process, other
+    workers see a coverage change once their copy is max_age old, up
+    to 5 minutes by default.
+    """
+
+    def __init__(self, max_age: float = 300):
+        self.max_age = max_age
+        self._partners: list[UUID] = []
+        self._zipcodes: dict[int, array] = {}
+        self._built_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return self._built_at is None or monotonic() - self._built_at > self.max_age
+
+    def invalidate(self):
+        self._built_at = None
+
+    async def build(self, session: AsyncSession):
+        partners: list[UUID] = []
+        zipcodes: dict[int, list[int]] = {}
+
+        result = await session.stream(
+            select(DeliveryPartner.id, DeliveryPartner.serviceable_zipcodes)
+            .order_by(DeliveryPartner.id)
+            .execution_options(yield_per=1000)
+        )
+        async for partner_id, serviceable_zipcodes in result:
+            slot = len(partners)
+            partners.append(partner_id)
+            for zipcode in set(serviceable_zipcodes or ()):
+                zipcodes.setdefault(zipcode, []).append(slot)
+
+        # Slots are handed out in order, so every list is already sorted
+        self._zipcodes = {
+            zipcode: array("I", slots) for zipcode, slots in zipcodes.items()
+        }
+        self._partners = partners
+        self._built_at = monotonic()
+
+    async def ensure(self, session: AsyncSession):
+        if not self.stale:
+            return
+        async with self._lock:
+            # Another task may have rebuilt it while we waited
+            if self.stale:
+                await self.build(session)
+
+    def lookup(self, zipcode: int) -> list[UUID]:
+        partners = self._partners
+        return [partners[slot] for slot in self._zipcodes.get(zipcode, ())]
+
+
+coverage_index = CoverageIndex()
@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+from time import monotonic
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import Integer, cast, delete, func, insert, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import DeliveryEstimate, Shipment, ShipmentEvent, ShipmentEventArchive
+from app.schemas.enums import ShipmentStatus
+from app.services.base import BaseService
+
+DEFAULT_TRANSIT = timedelta(days=3)
+
+
+class DeliveryEstimates:
+    """Process local transit time lookup
+
+    Holds the delivery_estimates table keyed by (origin, destination,
+    partner), plus a per lane fallback averaged over its partners for
+    partners without enough history there. Reloaded when older than
+    max_age seconds to pick up the nightly rebuild.
+    """
+
+    def __init__(self, max_age: float = 3600):
+        self.max_age = max_age
+        self._partners: dict[tuple[int, int, UUID], int] = {}
+        self._lanes: dict[tuple[int, int], int] = {}
+        self._loaded_at: float | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or monotonic() - self._loaded_at > self.max_age
+
+    async def load(self, session: AsyncSession):
+        result = await session.execute(select(
+            DeliveryEstimate.origin,
+            DeliveryEstimate.destination,
+            DeliveryEstimate.delivery_partner_id,
+            DeliveryEstimate.transit_seconds,
+            DeliveryEstimate.samples,
+        ))
+        rows = result.all()
+        self._partners = {
+            (origin, destination, partner_id): seconds
+            for origin, destination, partner_id, seconds, _ in rows
+        }
+
+        # Sample weighted mean of the partner medians of each lane
+        self._lanes = {}
+        if rows:
+            origin, destination, _, seconds, samples = (np.array(column) for column in zip(*rows))
+            lanes, lane = np.unique(np.stack([origin, destination], axis=1), axis=0, return_inverse=True)
+            lane = lane.ravel()
+            weights = np.bincount(lane, weights=samples)
+            means = np.bincount(lane, weights=seconds * samples) / weights
+            self._lanes = dict(zip(map(tuple, lanes.tolist()), means.astype(int).tolist()))
+        self._loaded_at = monotonic()
+
+    async def ensure(self, session: AsyncSession):
+        if not self.stale:
+            return
+        async with self._lock:
+            if self.stale:
+                await self.load(session)
+
+    def estimate(self, origin: int, destination: int, partner_id: UUID) -> timedelta:
+        seconds = (
+            self._partners.get((origin, destination, partner_id))
+            or self._lanes.get((origin, destination))
+        )
+        return timedelta(seconds=seconds) if seconds else DEFAULT_TRANSIT
+
+
+delivery_estimates = DeliveryEstimates()
+
+
+class DeliveryEstimateService(BaseService):
+    def __init__(self, session, history: timedelta = timedelta(days=180), min_samples: int = 5):
+        super().__init__(DeliveryEstimate, session)
+        self.history = history
+        self.min_samples = min_samples
+
+    async def rebuild(self) -> int:
+        # Median placed -> delivered time per lane and partner, aggregated
+        # by Postgres in one INSERT ... SELECT over live and archived events
+        since = datetime.now() - self.history
+
+        def milestones(model):
+            return select(
+                model.shipment_id, model.status, model.location, model.created_at,
+            ).where(
+                model.status.in_([ShipmentStatus.placed, ShipmentStatus.delivered]),
+                model.created_at >= since,
+            )
+
+        events = union_all(milestones(ShipmentEvent), milestones(ShipmentEventArchive)).subquery()
+        placed = events.c.status == ShipmentStatus.placed
+        delivered = events.c.status == ShipmentStatus.delivered
+        transits = (
+            select(
+                events.c.shipment_id,
+                func.min(events.c.location).filter(placed).label("origin"),
+                (
+                    func.min(events.c.created_at).filter(delivered)
+                    - func.min(events.c.created_at).filter(placed)
+                ).label("transit"),
+            )
+            .group_by(events.c.shipment_id)
+            .subquery()
+        )
+        seconds = func.percentile_cont(0.5).within_group(func.extract("epoch", transits.c.transit))
+
+        await self.session.execute(delete(DeliveryEstimate))
+        result = await self.session.execute(
+            insert(DeliveryEstimate).from_select(
+                ["origin", "destination", "delivery_partner_id", "transit_seconds", "samples"],
+                select(
+                    transits.c.origin,
+                    Shipment.destination,
+                    Shipment.delivery_partner_id,
+                    cast(seconds, Integer),
+                    func.count(),
+                )
+                .join(Shipment, Shipment.id == transits.c.shipment_id)
+                .where(
+                    transits.c.origin.is_not(None),
+                    transits.c.transit.is_not(None),
+                    Shipment.delivery_partner_id.is_not(None),
+                )
+                .group_by(transits.c.origin, Shipment.destination, Shipment.delivery_partner_id)
+                .having(func.count() >= self.min_samples)
+            )
+        )
+        await self.session.commit()
+        return result.rowcount
@@ -1,41 +1,348 @@
-from typing import Sequence
-from fastapi import HTTPException, status
-from sqlalchemy import select, any_
+import asyncio
+import logging
+from typing import AsyncIterator, Sequence
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import Row, and_, func, or_, select, any_, update
+from app.config import app_settings
+from app.core.exceptions import DeliveryPartnerNotAvailable
 from app.database.models import DeliveryPartner, Shipment
+from app.database.session import engine
+from app.schemas.enums import CLOSED_STATUSES
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.delivery_partner import CreateDeliveryPartner
+from app.schemas.delivery_partner import CreateDeliveryPartner, ManifestShipment, ManifestStop
+from .assignment import AssignmentStrategy, get_strategy, solve
+from .coverage import coverage_index
+from .principals import principal_cache
 from .user import UserService
 
+logger = logging.getLogger(__name__)
+
 
 class DeliveryPartnerService(UserService):
-    def __init__(self, session: AsyncSession, ):
+    role = "partner"
+
+    def __init__(self, session: AsyncSession, strategy: AssignmentStrategy | None = None):
         super().__init__(DeliveryPartner, session)
+        self.strategy = strategy or get_strategy()
+        # Partners of slots reserved by assignment_batcher
+        self.batched: list[UUID] = []
 
     async def get_partnes_by_zipcode(self, zipcode: str) -> Sequence[DeliveryPartner]:
+        await coverage_index.ensure(self.session)
         result = await self.session.scalars(
             select(DeliveryPartner).where(
-                any_(DeliveryPartner.serviceable_zipcodes) == zipcode)
+                DeliveryPartner.id.in_(coverage_index.lookup(zipcode)))
         )
         return result.all()
 
     async def assign_shipment(self, shipment: Shipment):
-        eligible_partners = await self.get_partnes_by_zipcode(shipment.destination)
-        for partner in eligible_partners:
-            if partner.current_handling_capacity > 0:
-                partner.shipments.append(shipment)
+        await coverage_index.ensure(self.session)
+        covering_partners = coverage_index.lookup(shipment.destination)
+        if not covering_partners:
+            raise DeliveryPartnerNotAvailable()
+
+        if assignment_batcher.window:
+            partner = await assignment_batcher.assign(shipment.destination)
+            if partner:
+                # Committed apart from the shipment, see release_batched
+                self.batched.append(partner.id)
                 return partner
-        raise HTTPException(
-            status_code=status.HTTP_406_NOT_ACCEPTABLE,
-            detail="No delivery partner available for this shipment"
+            raise DeliveryPartnerNotAvailable()
+
+        # Reserve a slot with a single UPDATE of the best ranked partner.
+        # SKIP LOCKED makes concurrent requests move on to the next
+        # partner instead of queueing on the same row. Coverage is
+        # re-checked on the row in case the index is behind an update
+        # from another process.
+        def reserve(skip_locked: bool):
+            candidate = (
+                select(DeliveryPartner.id)
+                .where(
+                    DeliveryPartner.id.in_(covering_partners),
+                    any_(DeliveryPartner.serviceable_zipcodes) == shipment.destination,
+                    DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity,
+                )
+                .order_by(*self.strategy.order_by())
+                .limit(1)
+                .with_for_update(skip_locked=skip_locked)
+                .scalar_subquery()
+            )
+            return (
+                update(DeliveryPartner)
+                .where(
+                    DeliveryPartner.id == candidate,
+                    DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity,
+                )
+                .values(active_shipment_count=DeliveryPartner.active_shipment_count + 1)
+                .returning(DeliveryPartner)
+            )
+
+        partner = await self.session.scalar(reserve(skip_locked=True))
+        if partner:
+            return partner
+
+        # Every partner with room may just be locked by other requests,
+        # wait for one of them before giving up
+        partner = await self.session.scalar(reserve(skip_locked=False))
+        if partner:
+            return partner
+        # Same outcome as no coverage at all, reported the same way
+        raise DeliveryPartnerNotAvailable()
+
+    async def assign_shipments(self, destinations: list[int], attempts: int = 3) -> list[Row | None]:
+        # Partners for a whole batch, None where nobody is available
+        await coverage_index.ensure(self.session)
+        candidates = {
+            zipcode: coverage_index.lookup(zipcode) for zipcode in set(destinations)
+        }
+        partner_ids = set().union(*candidates.values())
+        if not partner_ids:
+            return [None] * len(destinations)
+
+        def partner_rows(ids):
+            return (
+                select(
+                    DeliveryPartner.id,
+                    DeliveryPartner.name,
+                    DeliveryPartner.active_shipment_count,
+                    DeliveryPartner.max_handling_capacity,
+                )
+                .where(DeliveryPartner.id.in_(ids))
+                .order_by(DeliveryPartner.id)
+            )
+
+        # Solved on a snapshot, nothing is locked yet
+        partners = (await self.session.execute(
+            partner_rows(partner_ids).where(
+                DeliveryPartner.active_shipment_count < DeliveryPartner.max_handling_capacity)
+        )).all()
+        if not partners:
+            return [None] * len(destinations)
+
+        # Coverage matrix, one row per distinct destination
+        # expanded to one row per shipment
+        columns = {row.id: column for column, row in enumerate(partners)}
+        zipcodes = {zipcode: index for index, zipcode in enumerate(candidates)}
+        coverage = np.zeros((len(zipcodes), len(partners)), dtype=bool)
+        for zipcode, index in zipcodes.items():
+            coverage[index, [columns[id] for id in candidates[zipcode] if id in columns]] = True
+        eligible = coverage[[zipcodes[zipcode] for zipcode in destinations]]
+        load = np.array([row.active_shipment_count for row in partners])
+        capacity = np.array([row.max_handling_capacity for row in partners])
+
+        assigned = np.full(len(destinations), -1)
+        # Column -> count when locked, for the partners picked so far
+        locked: dict[int, int] = {}
+        for _ in range(attempts):
+            pending = np.flatnonzero(assigned < 0)
+            choice = await asyncio.to_thread(solve, eligible[pending], load, capacity, self.strategy)
+            if not (choice >= 0).any():
+                break
+
+            # Lock only the partners picked. SKIP LOCKED moves on from
+            # rows other requests hold, the solver routes around them.
+            picked = set(choice[choice >= 0].tolist()) - locked.keys()
+            if picked:
+                result = await self.session.execute(
+                    partner_rows([partners[column].id for column in picked])
+                    .with_for_update(skip_locked=True)
+                )
+                fresh = {row.id: row for row in result}
+                for column in picked:
+                    row = fresh.get(partners[column].id)
+                    if row is None:
+                        eligible[:, column] = False
+                        continue
+                    locked[column] = row.active_shipment_count
+                    load[column] = row.active_shipment_count
+                    capacity[column] = row.max_handling_capacity
+
+            # Keep the picks that still fit the locked counts,
+            # the others are solved again
+            for column in set(choice.tolist()) & locked.keys():
+                fits = pending[choice == column][:max(capacity[column] - load[column], 0)]
+                assigned[fits] = column
+                load[column] += len(fits)
+
+        changed = [
+            {"id": partners[column].id, "active_shipment_count": int(load[column])}
+            for column, count in locked.items()
+            if load[column] != count
+        ]
+        if changed:
+            # Rows are locked above, absolute values are safe here
+            await self.session.execute(update(DeliveryPartner), changed)
+        return [partners[column] if column >= 0 else None for column in assigned.tolist()]
+
+    async def release_batched(self):
+        # Slots the batcher committed for shipments that
+        # were not added after all
+        batched, self.batched = self.batched, []
+        if not batched:
+            return
+        async with AsyncSession(engine) as session:
+            for partner_id in batched:
+                await session.execute(
+                    update(DeliveryPartner)
+                    .where(
+                        DeliveryPartner.id == partner_id,
+                        DeliveryPartner.active_shipment_count > 0,
+                    )
+                    .values(active_shipment_count=DeliveryPartner.active_shipment_count - 1)
+                )
+            await session.commit()
+
+    async def manifest(self, partner_id: UUID) -> AsyncIterator[ManifestStop]:
+        # Active shipments in destination order, answered from the
+        # partial covering index and grouped while streaming
+        query = (
+            select(
+                Shipment.id,
+                Shipment.destination,
+                Shipment.current_status.label("status"),
+                Shipment.current_location.label("location"),
+                Shipment.estimated_delivery,
+                Shipment.content,
+                Shipment.weight,
+            )
+            .where(
+                Shipment.delivery_partner_id == partner_id,
+                Shipment.current_status.not_in(CLOSED_STATUSES),
+            )
+            .order_by(Shipment.destination, Shipment.created_at)
+            .execution_options(yield_per=500)
+        )
+
+        stop = None
+        result = await self.session.stream(query)
+        async for row in result:
+            if stop is None or stop.destination != row.destination:
+                if stop is not None:
+                    yield stop
+                stop = ManifestStop(destination=row.destination, shipments=[])
+            stop.shipments.append(ManifestShipment.model_validate(row))
+        if stop is not None:
+            yield stop
+
+    async def reconcile_capacity(self) -> int:
+        # Recount active shipments of every partner in one statement
+        # and fix the counters that drifted. Partner rows are locked
+        # first, in id order like assignment, so no slot is reserved or
+        # released between the count and the write.
+        if assignment_batcher.window:
+            # The batcher commits slots before their shipments are
+            # inserted, a recount would take those slots back
+            logger.warning("Skipping capacity reconcile, assignment batching is on")
+            return 0
+        await self.session.execute(
+            select(DeliveryPartner.id)
+            .order_by(DeliveryPartner.id)
+            .with_for_update()
         )
+        counts = (
+            select(
+                DeliveryPartner.id,
+                func.count(Shipment.id).label("active"),
+            )
+            .outerjoin(
+                Shipment,
+                and_(
+                    Shipment.delivery_partner_id == DeliveryPartner.id,
+                    # No event yet counts as active, like a fresh assignment
+                    or_(
+                        Shipment.current_status.is_(None),
+                        Shipment.current_status.not_in(CLOSED_STATUSES),
+                    ),
+                ),
+            )
+            .group_by(DeliveryPartner.id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(DeliveryPartner)
+            .where(
+                DeliveryPartner.id == counts.c.id,
+                DeliveryPartner.active_shipment_count != counts.c.active,
+            )
+            .values(active_shipment_count=counts.c.active)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return result.rowcount
 
     async def add(self, delivery_partner: CreateDeliveryPartner):
-        return await self._add_user(delivery_partner.model_dump(), router_prefix="partner")
+        partner = await self._add_user(delivery_partner.model_dump(), router_prefix="partner")
+        coverage_index.invalidate()
+        return partner
 
     async def update(self, partner: DeliveryPartner):
-        return await self._update(partner)
+        partner = await self._update(partner)
+        coverage_index.invalidate()
+        principal_cache.invalidate(partner.id)
+        return partner
 
     async def token(self, email, password) -> str:
         token = await self._generate_token(email, password)
         return token
+
+
+class AssignmentBatcher:
+    """Collects single shipment assignments over a short window
+
+    Requests arriving within the window are solved together by
+    assign_shipments and their slots reserved in one transaction,
+    instead of every request locking and updating a partner row.
+    Callers give the slot back with release_batched when their
+    shipment isn't added.
+    """
+
+    def __init__(self, window: float = app_settings.ASSIGNMENT_BATCH_WINDOW, max_batch: int = 500):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[int, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def assign(self, destination: int) -> Row | None:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((destination, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._solve(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _solve(self, batch: list[tuple[int, asyncio.Future]]):
+        try:
+            async with AsyncSession(engine) as session:
+                partners = await DeliveryPartnerService(session).assign_shipments(
+                    [destination for destination, _ in batch]
+                )
+                await session.commit()
+        except Exception as error:
+            logger.exception("Failed to assign a batch of %d shipments", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future), partner in zip(batch, partners):
+            if not future.done():
+                future.set_result(partner)
+
+
+assignment_batcher = AssignmentBatcher()
@@ -1,30 +1,40 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 
 from app.database.session import engine
+from app.services.delivery_estimate import DeliveryEstimateService
 from app.services.delivery_partner import DeliveryPartnerService
 from app.services.seller import SellerService
 from app.services.shipment import ShipmentService
 from app.services.shipment_event import ShipmentEventService
+from app.services.shipment_event_archive import ShipmentEventArchiveService
+from app.services.webhook import WebhookService
 
 
 class ServiceFactory:
-    def __init__(self):
+    def __init__(self, bind: AsyncEngine = engine):
+        self.bind = bind
         self.session: AsyncSession | None = None
         self.shipment: ShipmentService | None = None
         self.seller: SellerService | None = None
         self.delivery_partner: DeliveryPartnerService | None = None
+        self.delivery_estimate: DeliveryEstimateService | None = None
         self.shipment_event: ShipmentEventService | None = None
+        self.shipment_event_archive: ShipmentEventArchiveService | None = None
+        self.webhook: WebhookService | None = None
 
     async def __aenter__(self):
-        maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=True)
+        maker = sessionmaker(self.bind, class_=AsyncSession, expire_on_commit=True)
         self.session = maker()
         event_svc = ShipmentEventService(self.session)
         partner_svc = DeliveryPartnerService(self.session)
         self.shipment = ShipmentService(self.session, partner_svc, event_svc)
         self.seller = SellerService(self.session)
         self.delivery_partner = partner_svc
+        self.delivery_estimate = DeliveryEstimateService(self.session)
         self.shipment_event = event_svc
+        self.shipment_event_archive = ShipmentEventArchiveService(self.session)
+        self.webhook = event_svc.webhooks
         return self
 
     async def __aexit__(self, *args):
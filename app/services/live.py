@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from contextlib import suppress
+from uuid import UUID
+
+from app.database.redis import SHIPMENT_EVENTS_CHANNEL, shipment_events_pubsub
+
+logger = logging.getLogger(__name__)
+
+
+class ShipmentEventHub:
+    """Fans published shipment events out to this process' live connections
+
+    There's a single redis subscription per process whatever the number
+    of clients. Each client only holds a small queue, a slow client
+    loses its oldest events instead of holding up the others.
+    """
+
+    def __init__(self, queue_size: int = 16, retry_delay: float = 1.0, max_retry_delay: float = 30.0):
+        self.queue_size = queue_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._subscribers: dict[UUID, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, shipment_id: UUID) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(shipment_id, set()).add(queue)
+        # Started with the first client
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, shipment_id: UUID, queue: asyncio.Queue):
+        queues = self._subscribers.get(shipment_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[shipment_id]
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _listen(self):
+        delay = self.retry_delay
+        while True:
+            pubsub = shipment_events_pubsub()
+            try:
+                await pubsub.subscribe(SHIPMENT_EVENTS_CHANNEL)
+                delay = self.retry_delay
+                async for message in pubsub.listen():
+                    self._dispatch(message["data"])
+            except Exception:
+                # Events published while disconnected are lost,
+                # clients still have /track to catch up
+                logger.exception("Shipment event subscription lost, reconnecting")
+            finally:
+                with suppress(Exception):
+                    await pubsub.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _dispatch(self, message: str):
+        # "<shipment id>|<event json>", the json is passed through as is
+        shipment_id, _, event = message.partition("|")
+        try:
+            shipment_id = UUID(shipment_id)
+        except ValueError:
+            # Dropped, the listener carries on with the next one
+            logger.warning("Malformed shipment event message: %.100r", message)
+            return
+        for queue in self._subscribers.get(shipment_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+shipment_event_hub = ShipmentEventHub()
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import Shipment, ShipmentPing
+from app.database.session import engine
+
+logger = logging.getLogger(__name__)
+
+
+class PingBuffer:
+    """In-process buffer of scanner location pings
+
+    Pings are written in the background with one multi-row INSERT
+    per flush, together with the latest location of each shipment.
+    The last location seen per shipment is remembered so repeated
+    scans at the same place can be dropped before they are buffered.
+    """
+
+    def __init__(self, interval: float = 2.0, max_rows: int = 5000, max_tracked: int = 100_000):
+        self.interval = interval
+        self.max_rows = max_rows
+        self.max_tracked = max_tracked
+        self._rows: list[dict] = []
+        self._last: OrderedDict[UUID, int] = OrderedDict()
+        self._full = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    def last_location(self, shipment_id: UUID) -> int | None:
+        return self._last.get(shipment_id)
+
+    def add(self, shipment_id: UUID, location: int, at: datetime | None = None) -> bool:
+        # False when the shipment is already known to be there
+        if self._last.get(shipment_id) == location:
+            return False
+
+        self.remember(shipment_id, location)
+        self._rows.append({
+            "shipment_id": shipment_id,
+            "location": location,
+            "created_at": at or datetime.now(),
+        })
+        if len(self._rows) >= self.max_rows:
+            self._full.set()
+        return True
+
+    def remember(self, shipment_id: UUID, location: int):
+        self._last[shipment_id] = location
+        self._last.move_to_end(shipment_id)
+        if len(self._last) > self.max_tracked:
+            self._last.popitem(last=False)
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Wake the loop and let it finish, a cancelled flush would
+        # lose the rows it took, then write whatever came in since
+        if self._task:
+            self._stopping = True
+            self._full.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self._full.clear()
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+
+        # Latest location per shipment, pings are in arrival order
+        locations = {row["shipment_id"]: row["location"] for row in rows}
+        try:
+            async with AsyncSession(engine) as session:
+                await session.execute(insert(ShipmentPing), rows)
+                await session.execute(
+                    update(Shipment),
+                    [{"id": id, "current_location": location}
+                     for id, location in locations.items()],
+                )
+                await session.commit()
+        except Exception:
+            # Keep the rows for the next flush unless the buffer is full
+            logger.exception("Failed to write %d location pings", len(rows))
+            if len(self._rows) + len(rows) <= self.max_rows * 10:
+                self._rows[:0] = rows
+
+
+ping_buffer = PingBuffer()
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from time import monotonic
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import DeliveryPartner, Seller
+from app.schemas.principal import Principal
+
+
+class PrincipalCache:
+    """Process local cache of authenticated sellers and partners
+
+    Only the Principal columns are read and entries are served for
+    ttl seconds. Profile changes made by this process invalidate the
+    entry right away, other processes pick them up once it expires.
+    """
+
+    def __init__(self, ttl: float = 30, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, UUID], tuple[float, Principal]] = OrderedDict()
+
+    async def get(self, session: AsyncSession, model: type[Seller] | type[DeliveryPartner], id: UUID) -> Principal | None:
+        key = (model.__tablename__, id)
+        entry = self._entries.get(key)
+        if entry and monotonic() - entry[0] < self.ttl:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        columns = [model.id, model.name, model.email_verified]
+        if model is Seller:
+            columns.append(Seller.zip_code)
+        row = (await session.execute(select(*columns).where(model.id == id))).first()
+        if row is None:
+            self._entries.pop(key, None)
+            return None
+
+        principal = Principal.model_validate(row._mapping)
+        self._entries[key] = (monotonic(), principal)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, id: UUID):
+        for model in (Seller, DeliveryPartner):
+            self._entries.pop((model.__tablename__, id), None)
+
+
+principal_cache = PrincipalCache()
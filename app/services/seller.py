@@ -5,15 +5,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models import Seller
 from app.schemas.seller import CreateSeller
 
-
-from passlib.context import CryptContext
-
 from .user import UserService
 
-password_context = CryptContext(schemes=["bcrypt"])
-
 
 class SellerService(UserService):
+    role = "seller"
+
     def __init__(self, session: AsyncSession):
         super().__init__(Seller, session)
 
@@ -1,20 +1,34 @@
-from datetime import datetime, timedelta
-from uuid import UUID
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Sequence
+from uuid import UUID, uuid4
 from fastapi import HTTPException, status
-from sqlalchemy import select
-from app.core.exceptions import ClientNotAuthorized, EntityNotFound
-from app.database.models import DeliveryPartner, Review, Seller, Shipment
-from app.database.redis import get_shipment_verification_code
-from app.schemas.enums import TagNames
-from app.schemas.shipment import CreateShipment, ShipmentReview, ShipmentStatus, UpdateShipment
+from fastapi.templating import Jinja2Templates
+from sqlalchemy import Row, Select, delete, exists, func, insert, select, tuple_, update
+from app.core.exceptions import ClientNotAuthorized, DeliveryPartnerNotAvailable, EntityNotFound, InvalidCursor
+from app.database.loaders import LoadProfile, load_options
+from app.database.models import Review, Shipment, ShipmentEventArchive, ShipmentTag
+from app.database.redis import get_shipment_verification_code, get_shipment_verification_codes
+from app.schemas.encoders import encode_shipment, encode_tracking
+from app.schemas.enums import ShipmentSort, TagNames
+from app.schemas.principal import Principal
+from app.schemas.shipment import BulkShipmentResult, CreateShipment, LocationPing, PingIngestResult, ShipmentSearch, ShipmentReview, ShipmentStatus, UpdateShipment
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.services.delivery_estimate import delivery_estimates
 from app.services.delivery_partner import DeliveryPartnerService
+from app.services.shipment_cache import invalidate_shipments, shipment_cache, tracking_json_cache, tracking_page_cache
+from app.services.live import shipment_event_hub
+from app.services.ping_buffer import ping_buffer
 from app.services.shipment_event import ShipmentEventService
-from app.utils import decode_url_safe_token
+from app.services.tags import tag_registry
+from app.utils import TEMPLATES_DIR, decode_cursor, decode_url_safe_token, encode_cursor
 
 from .base import BaseService
 
+templates = Jinja2Templates(TEMPLATES_DIR)
+
 
 class ShipmentService(BaseService):
     def __init__(self, session: AsyncSession, partner_service: DeliveryPartnerService, event_service: ShipmentEventService):
@@ -22,36 +36,287 @@ class ShipmentService(BaseService):
         self.partner_service = partner_service
         self.event_service = event_service
 
-    async def get_all(self):
-        result = await self.session.execute(select(Shipment))
-        return result.scalars().all()
+    def _list_query(
+        self,
+        cursor: str | None = None,
+        seller_id: UUID | None = None,
+        delivery_partner_id: UUID | None = None,
+        tag_ids: list[UUID] | None = None,
+        match_all_tags: bool = False,
+        statuses: list[ShipmentStatus] | None = None,
+        destination: int | None = None,
+        created_after: datetime | None = None,
+        created_before: datetime | None = None,
+        eta_after: datetime | None = None,
+        eta_before: datetime | None = None,
+        sort: ShipmentSort = ShipmentSort.newest,
+    ) -> Select:
+        # Plain columns only, so listing never touches the relationship graph
+        query = select(
+            Shipment.id,
+            Shipment.content,
+            Shipment.weight,
+            Shipment.destination,
+            Shipment.estimated_delivery,
+            Shipment.current_status.label("status"),
+            Shipment.created_at,
+            Shipment.seller_id,
+            Shipment.delivery_partner_id,
+        )
+
+        if seller_id:
+            query = query.where(Shipment.seller_id == seller_id)
+        if delivery_partner_id:
+            query = query.where(
+                Shipment.delivery_partner_id == delivery_partner_id)
+        if statuses:
+            query = query.where(Shipment.current_status.in_(statuses))
+        if destination is not None:
+            query = query.where(Shipment.destination == destination)
+        if created_after:
+            query = query.where(Shipment.created_at >= created_after)
+        if created_before:
+            query = query.where(Shipment.created_at < created_before)
+        if eta_after:
+            query = query.where(Shipment.estimated_delivery >= eta_after)
+        if eta_before:
+            query = query.where(Shipment.estimated_delivery < eta_before)
+
+        if tag_ids:
+            # Semi-join on the link table, with all tags required
+            # the shipment has to show up once per tag
+            tagged = select(ShipmentTag.shipment_id).where(
+                ShipmentTag.tag_id.in_(tag_ids))
+            if match_all_tags:
+                tagged = tagged.group_by(ShipmentTag.shipment_id).having(
+                    func.count() == len(set(tag_ids)))
+            query = query.where(Shipment.id.in_(tagged))
+
+        # Keyset on (sort key, id), the id breaks ties between equal keys
+        sort_key = Shipment.estimated_delivery if sort == ShipmentSort.eta else Shipment.created_at
+        descending = sort == ShipmentSort.newest
+        if descending:
+            query = query.order_by(sort_key.desc(), Shipment.id.desc())
+        else:
+            query = query.order_by(sort_key, Shipment.id)
+
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                raise InvalidCursor()
+            key = tuple_(sort_key, Shipment.id)
+            query = query.where(
+                key < tuple_(*position) if descending else key > tuple_(*position))
+        return query
+
+    async def get_page(self, limit: int, cursor: str | None = None, **filters) -> tuple[Sequence[Row], str | None]:
+        # Fetch one extra row to know whether there is a next page
+        result = await self.session.execute(
+            self._list_query(cursor, **filters).limit(limit + 1)
+        )
+        rows = result.all()
+        if len(rows) <= limit:
+            return rows, None
+
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_key = last.estimated_delivery if filters.get("sort") == ShipmentSort.eta else last.created_at
+        return rows, encode_cursor(sort_key, last.id)
 
-    async def get(self, id: UUID) -> Shipment | None:
-        shipment = await self._get(id)
+    async def search(self, search: ShipmentSearch, **scope) -> tuple[Sequence[Row], str | None]:
+        # The caller's scope always wins over the requested partner filter
+        filters = {"delivery_partner_id": search.delivery_partner_id, **scope}
+        return await self.get_page(
+            search.limit,
+            search.cursor,
+            statuses=search.status,
+            destination=search.destination,
+            tag_ids=await self.get_tag_ids(search.tag) if search.tag else None,
+            match_all_tags=search.match == "all",
+            created_after=search.created_after,
+            created_before=search.created_before,
+            eta_after=search.eta_after,
+            eta_before=search.eta_before,
+            sort=search.sort,
+            **filters,
+        )
+
+    def stream(self, cursor: str | None = None, **filters) -> AsyncIterator[Row]:
+        # Build the query eagerly so a bad cursor fails before streaming starts
+        query = self._list_query(cursor, **filters)
+        return self._stream(query)
+
+    async def _stream(self, query: Select) -> AsyncIterator[Row]:
+        # Server side cursor, rows are fetched from postgres in chunks
+        result = await self.session.stream(
+            query.execution_options(yield_per=500))
+        async for row in result:
+            yield row
+
+    async def get(self, id: UUID, profile: LoadProfile = LoadProfile.shipment_detail) -> Shipment | None:
+        shipment = await self._get(id, profile)
         if not shipment:
             raise EntityNotFound()
 
+        # Both profiles load the live timeline, add the archived part
+        if shipment.events_archived and profile in (LoadProfile.shipment_detail, LoadProfile.tracking):
+            archived = await self.session.scalars(
+                select(ShipmentEventArchive)
+                .where(ShipmentEventArchive.shipment_id == id)
+                .order_by(ShipmentEventArchive.created_at)
+            )
+            set_committed_value(shipment, "archived_timeline", archived.all())
+
         return shipment
 
-    async def add(self, shipment_create: CreateShipment, seller: Seller):
+    async def live(self, id: UUID) -> AsyncIterator[str]:
+        # Server-sent events of the shipment's new timeline entries
+        await self.get_version(id)
+        # Streams stay open for long, don't hold a pooled connection
+        await self.session.close()
+        return self._live(id)
+
+    async def _live(self, id: UUID) -> AsyncIterator[str]:
+        # Subscribed once the response starts streaming, a response
+        # that never starts never leaves a queue behind
+        queue = shipment_event_hub.subscribe(id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                    yield f"event: timeline\ndata: {event}\n\n"
+                except asyncio.TimeoutError:
+                    # Keeps proxies from closing idle connections
+                    yield ": keep-alive\n\n"
+        finally:
+            shipment_event_hub.unsubscribe(id, queue)
+
+    async def get_version(self, id: UUID) -> int:
+        # Primary key lookup of a single column, cheap enough for polling
+        version = await self.session.scalar(
+            select(Shipment.version).where(Shipment.id == id)
+        )
+        if version is None:
+            raise EntityNotFound()
+        return version
+
+    async def get_payload(self, id: UUID, version: int) -> str:
+        # Serialized GetShipment, served from cache when possible
+        async def load():
+            shipment = await self.get(id)
+            return shipment.version, encode_shipment(shipment).decode()
+
+        _, payload = await shipment_cache.get_or_load(id, load, version)
+        return payload
+
+    async def get_tracking(self, id: UUID, version: int, as_json: bool = False) -> str:
+        # Rendered tracking page (or its JSON variant), rendered once per version
+        async def load():
+            shipment = await self.get(id, LoadProfile.tracking)
+            if as_json:
+                return shipment.version, encode_tracking(shipment).decode()
+            return shipment.version, self._render_tracking_page(shipment)
+
+        cache = tracking_json_cache if as_json else tracking_page_cache
+        _, payload = await cache.get_or_load(id, load, version)
+        return payload
+
+    def _render_tracking_page(self, shipment: Shipment) -> str:
+        context = shipment.model_dump()
+        context["partner"] = shipment.delivery_partner.name
+        context["seller"] = shipment.seller.name
+        context["timeline"] = shipment.timeline
+        context["status"] = shipment.status
+
+        return templates.get_template("track.html").render(context)
+
+    async def add(self, shipment_create: CreateShipment, seller: Principal):
         shipment = Shipment(
             **shipment_create.model_dump(),
             status=ShipmentStatus.placed,
-            estimated_delivery=datetime.now()+timedelta(days=3),
             seller_id=seller.id
         )
 
         partner = await self.partner_service.assign_shipment(shipment)
-        shipment.delivery_partner_id = partner.id
-        new_shipment = await self._add(shipment)
-        new_event = await self.event_service.add(shipment=new_shipment,
-                                                 location=seller.zip_code,
-                                                 status=ShipmentStatus.placed,)
-        shipment.timeline.append(new_event)
+        try:
+            shipment.delivery_partner_id = partner.id
+            await delivery_estimates.ensure(self.session)
+            shipment.estimated_delivery = self._estimate_delivery(seller.zip_code, shipment.destination, partner.id)
+            self.session.add(shipment)
+            await self.session.commit()
+        except BaseException:
+            # Batched slots are committed already, give them back
+            await asyncio.shield(self.partner_service.release_batched())
+            raise
+        self.partner_service.batched.clear()
+        await self.session.refresh(shipment)
+
+        # Notification needs seller and partner names
+        new_shipment = await self.get(shipment.id, LoadProfile.tracking)
+        await self.event_service.add(shipment=new_shipment,
+                                     location=seller.zip_code,
+                                     status=ShipmentStatus.placed,)
 
         return new_shipment
 
-    async def update(self, id: UUID, shipment_update: UpdateShipment, delivery_partner: DeliveryPartner):
+    async def add_many(self, shipments_create: list[CreateShipment], seller: Principal) -> list[BulkShipmentResult]:
+        partners = await self.partner_service.assign_shipments(
+            [shipment_create.destination for shipment_create in shipments_create]
+        )
+        await delivery_estimates.ensure(self.session)
+
+        results = []
+        shipments = []
+        notifications = []
+        for index, (shipment_create, partner) in enumerate(zip(shipments_create, partners)):
+            if partner is None:
+                results.append(BulkShipmentResult(
+                    index=index,
+                    error=DeliveryPartnerNotAvailable.__doc__
+                ))
+                continue
+
+            shipment_id = uuid4()
+            shipments.append({
+                **shipment_create.model_dump(),
+                "id": shipment_id,
+                "estimated_delivery": self._estimate_delivery(
+                    seller.zip_code, shipment_create.destination, partner.id),
+                "seller_id": seller.id,
+                "delivery_partner_id": partner.id,
+                "current_status": ShipmentStatus.placed,
+                "current_location": seller.zip_code,
+            })
+            notifications.append({
+                "shipment_id": shipment_id,
+                "email": shipment_create.client_contact_email,
+                "seller": seller.name,
+                "delivery_partner": partner.name,
+            })
+            results.append(BulkShipmentResult(index=index, id=shipment_id))
+
+        if not shipments:
+            await self.session.rollback()
+            return results
+
+        # Shipments, their placed events and partner
+        # counters all land in a single transaction
+        await self.session.execute(insert(Shipment), shipments)
+        await self.event_service.add_many(
+            shipments,
+            location=seller.zip_code,
+            status=ShipmentStatus.placed,
+        )
+        await self.session.commit()
+        await self.event_service.after_commit()
+
+        self.event_service.notify_placed_many(notifications)
+        return results
+
+    def _estimate_delivery(self, origin: int, destination: int, partner_id: UUID) -> datetime:
+        return datetime.now() + delivery_estimates.estimate(origin, destination, partner_id)
+
+    async def update(self, id: UUID, shipment_update: UpdateShipment, delivery_partner: Principal):
         shipment = await self.get(id)
         if shipment.delivery_partner_id != delivery_partner.id:
             raise HTTPException(
@@ -62,23 +327,123 @@ class ShipmentService(BaseService):
         if shipment.status == ShipmentStatus.delivered:
             code = await get_shipment_verification_code(shipment.id)
 
-            if not shipment_update.verification_code or str(shipment_update.verification_code) != str(code):
+            if not self._code_matches(shipment_update, code):
                 raise ClientNotAuthorized()
 
-        update = shipment_update.model_dump(exclude_none=True,
-                                            exclude=["verification_code"])
-        shipment.sqlmodel_update(update)
+        event = self._apply_update(shipment, shipment_update)
+        if event:
+            await self.event_service.add(shipment=shipment,
+                                         **event)
+
+        await self._update(shipment)
+        await invalidate_shipments(id)
+        return await self.get(id)
+
+    async def update_many(self, updates: list[tuple[UUID, UpdateShipment]], delivery_partner: Principal) -> list[BulkShipmentResult]:
+        # Every shipment of the batch in one query
+        result = await self.session.scalars(
+            select(Shipment)
+            .where(Shipment.id.in_({id for id, _ in updates}))
+            .options(*load_options(LoadProfile.list_row))
+        )
+        shipments = {shipment.id: shipment for shipment in result}
+
+        delivered = [id for id, shipment in shipments.items()
+                     if shipment.status == ShipmentStatus.delivered]
+        codes = dict(zip(delivered, await get_shipment_verification_codes(delivered)))
+
+        results = []
+        changes = []
+        for index, (id, shipment_update) in enumerate(updates):
+            shipment = shipments.get(id)
+            if not shipment_update.model_dump(exclude_none=True, exclude={"id"}):
+                # Same as an empty single PATCH
+                error = "No data provided to update"
+            elif shipment is None:
+                error = "Shipment not found"
+            elif shipment.delivery_partner_id != delivery_partner.id:
+                error = "You are not authorized to update this shipment"
+            elif id in codes and not self._code_matches(shipment_update, codes[id]):
+                error = "Verification code is incorrect"
+            else:
+                error = None
+                event = self._apply_update(shipment, shipment_update)
+                if event:
+                    changes.append((shipment, event))
+            results.append(BulkShipmentResult(index=index, id=id, error=error))
 
+        if changes:
+            await self.event_service.add_batch(changes)
+        await self.session.commit()
+        await invalidate_shipments(*shipments)
+        await self.event_service.after_commit()
+        return results
+
+    async def ingest_pings(self, pings: list[tuple[int, LocationPing]], delivery_partner: Principal) -> PingIngestResult:
+        # Plain location pings go to the background buffer, only
+        # a change of status becomes a ShipmentEvent (and notifies)
+        rows = await self.session.execute(
+            select(
+                Shipment.id,
+                Shipment.delivery_partner_id,
+                Shipment.current_status,
+                Shipment.current_location,
+            ).where(Shipment.id.in_({ping.id for _, ping in pings}))
+        )
+        shipments = {row.id: row for row in rows}
+        statuses = {id: row.current_status for id, row in shipments.items()}
+
+        result = PingIngestResult()
+        updates = []
+        update_lines = []
+        for index, ping in pings:
+            shipment = shipments.get(ping.id)
+            if shipment is None:
+                result.errors.append(BulkShipmentResult(
+                    index=index, id=ping.id, error="Shipment not found"))
+            elif shipment.delivery_partner_id != delivery_partner.id:
+                result.errors.append(BulkShipmentResult(
+                    index=index, id=ping.id, error="You are not authorized to update this shipment"))
+            elif ping.status and ping.status != statuses[ping.id]:
+                statuses[ping.id] = ping.status
+                updates.append((ping.id, UpdateShipment(
+                    location=ping.location,
+                    status=ping.status,
+                    verification_code=ping.verification_code,
+                )))
+                update_lines.append(index)
+            else:
+                known = ping_buffer.last_location(ping.id)
+                if known is None:
+                    known = shipment.current_location
+                if ping.location != known and ping_buffer.add(ping.id, ping.location, ping.at):
+                    result.accepted += 1
+                else:
+                    result.duplicates += 1
+
+        if updates:
+            update_results = await self.update_many(updates, delivery_partner)
+            for index, (id, shipment_update), update_result in zip(update_lines, updates, update_results):
+                if update_result.error:
+                    result.errors.append(update_result.model_copy(update={"index": index}))
+                else:
+                    result.events += 1
+                    ping_buffer.remember(id, shipment_update.location)
+        return result
+
+    def _code_matches(self, shipment_update: UpdateShipment, code: str | None) -> bool:
+        return bool(shipment_update.verification_code) and str(shipment_update.verification_code) == str(code)
+
+    def _apply_update(self, shipment: Shipment, shipment_update: UpdateShipment) -> dict:
+        # Returns the event fields, empty when only the ETA changed
         if shipment_update.estimated_delivery:
             shipment.estimated_delivery = shipment_update.estimated_delivery
+            shipment.bump_version()
 
-        if len(update) > 1 or not shipment_update.estimated_delivery:
-            await self.event_service.add(shipment=shipment,
-                                         **update)
-
-        return await self._update(shipment)
+        return shipment_update.model_dump(exclude_none=True,
+                                          include={"location", "status", "description"})
 
-    async def cancel(self, id: UUID, seller: Seller):
+    async def cancel(self, id: UUID, seller: Principal):
         shipment = await self.get(id)
         if shipment.seller_id != seller.id:
             raise HTTPException(
@@ -91,12 +456,11 @@ class ShipmentService(BaseService):
                 detail="Delivered shipments cannot be cancelled"
             )
 
-        new_event = await self.event_service.add(shipment=shipment,
-                                                 status=ShipmentStatus.cancelled,
-                                                 location=seller.zip_code,
-                                                 description="Shipment cancelled by seller")
-        shipment.timeline.append(new_event)
-        return await self._update(shipment)
+        await self.event_service.add(shipment=shipment,
+                                     status=ShipmentStatus.cancelled,
+                                     location=seller.zip_code,
+                                     description="Shipment cancelled by seller")
+        return await self.get(id)
 
     async def delete(self, id: UUID) -> None:
         await self._delete(self.get(id))
@@ -109,7 +473,7 @@ class ShipmentService(BaseService):
                 detail="Invalid token"
             )
         shipment_id = UUID(data["id"])
-        shipment = await self.get(shipment_id)
+        shipment = await self.get(shipment_id, LoadProfile.tracking)
         if not shipment:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -127,27 +491,60 @@ class ShipmentService(BaseService):
 
         self.session.add(new_review)
         await self.session.commit()
+        await invalidate_shipments(shipment_id)
 
-    async def add_tag(self, id: UUID, tag_name: TagNames):
-        shipment = await self.get(id)
+    async def get_tag_ids(self, tag_names: list[TagNames]) -> list[UUID]:
+        return await tag_registry.ids(self.session, *tag_names)
 
-        tag = await tag_name.tag(self.session)
-        if tag in shipment.tags:
+    async def add_tag(self, id: UUID, tag_name: TagNames):
+        tag_id, = await tag_registry.ids(self.session, tag_name)
+        if await self._has_tag(id, tag_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Tag already exists for this shipment"
             )
-        shipment.tags.append(tag)
-        return await self._update(shipment)
 
-    async def delete_tag(self, id: UUID, tag_name: TagNames):
-        shipment = await self.get(id)
+        await self._bump_version(id)
+        self.session.add(ShipmentTag(shipment_id=id, tag_id=tag_id))
+        await self.session.commit()
+        await invalidate_shipments(id)
+        return await self.get(id)
 
-        tag = await tag_name.tag(self.session)
-        if tag in shipment.tags:
+    async def delete_tag(self, id: UUID, tag_name: TagNames):
+        tag_id, = await tag_registry.ids(self.session, tag_name)
+        if not await self._has_tag(id, tag_id):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Tag already exists for this shipment"
+                detail="Tag does not exist for this shipment"
             )
-        shipment.tags.remove(tag)
-        return await self._update(shipment)
+
+        await self._bump_version(id)
+        await self.session.execute(
+            delete(ShipmentTag).where(
+                ShipmentTag.shipment_id == id,
+                ShipmentTag.tag_id == tag_id,
+            )
+        )
+        await self.session.commit()
+        await invalidate_shipments(id)
+        return await self.get(id)
+
+    async def _has_tag(self, id: UUID, tag_id: UUID) -> bool:
+        # Primary key probe of the link table
+        return await self.session.scalar(
+            select(exists().where(
+                ShipmentTag.shipment_id == id,
+                ShipmentTag.tag_id == tag_id,
+            ))
+        )
+
+    async def _bump_version(self, id: UUID):
+        bumped = await self.session.scalar(
+            update(Shipment)
+            .where(Shipment.id == id)
+            .values(version=Shipment.version + 1)
+            .returning(Shipment.id)
+            .execution_options(synchronize_session=False)
+        )
+        if bumped is None:
+            raise EntityNotFound()
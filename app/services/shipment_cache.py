@@ -0,0 +1,112 @@
+import asyncio
+from typing import Awaitable, Callable
+from uuid import UUID
+
+from app.database.redis import (
+    count_shipment_cache_miss,
+    delete_cached_shipments,
+    get_cached_shipment,
+    get_shipment_cache_stats,
+    lock_cached_shipment,
+    set_cached_shipment,
+    unlock_cached_shipment,
+)
+
+# Loaders return the shipment version they read along with the payload
+Loader = Callable[[], Awaitable[tuple[int, str]]]
+
+
+class ShipmentCache:
+    """Read-through redis cache of serialized shipment payloads
+
+    Entries are stored as "<version>|<payload>", a caller asking for a
+    specific shipment version treats any other version as a miss.
+    Concurrent misses for the same shipment are collapsed into a single
+    load, within a process through a shared future and across processes
+    through a short lived redis lock.
+    """
+
+    def __init__(self, namespace: str, version: int = 1, ttl: int = 600, lock_timeout: float = 5.0, lock_wait: float = 1.0):
+        self.namespace = namespace
+        # Bumped whenever the payload shape changes, entries of an
+        # older shape are never read again and expire on their own
+        self.key = f"{namespace}:v{version}"
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self._inflight: dict[tuple[UUID, int | None], asyncio.Future] = {}
+        _caches.append(self)
+
+    async def get_or_load(self, id: UUID, loader: Loader, version: int | None = None) -> tuple[int, str]:
+        entry = self._unpack(await get_cached_shipment(self.key, id), version)
+        if entry is not None:
+            return entry
+
+        key = (id, version)
+        inflight = self._inflight.get(key)
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        # Failures without waiters shouldn't be reported as unretrieved
+        future.add_done_callback(lambda f: f.exception())
+        self._inflight[key] = future
+        try:
+            entry = await self._load(id, loader, version)
+            future.set_result(entry)
+            return entry
+        except Exception as exception:
+            future.set_exception(exception)
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _load(self, id: UUID, loader: Loader, version: int | None) -> tuple[int, str]:
+        await count_shipment_cache_miss(self.key)
+
+        locked = await lock_cached_shipment(self.key, id, self.lock_timeout)
+        if not locked:
+            # Another process is loading it, give it a moment
+            for _ in range(int(self.lock_wait / 0.05)):
+                await asyncio.sleep(0.05)
+                entry = self._unpack(
+                    await get_cached_shipment(self.key, id, count=False), version)
+                if entry is not None:
+                    return entry
+
+        try:
+            loaded_version, payload = await loader()
+            await set_cached_shipment(self.key, id, f"{loaded_version}|{payload}", self.ttl)
+            return loaded_version, payload
+        finally:
+            if locked:
+                await unlock_cached_shipment(self.key, id)
+
+    def _unpack(self, entry: str | None, version: int | None) -> tuple[int, str] | None:
+        if entry is None:
+            return None
+        cached_version, payload = entry.split("|", 1)
+        if version is not None and int(cached_version) != version:
+            return None
+        return int(cached_version), payload
+
+    async def stats(self) -> dict[str, int]:
+        return await get_shipment_cache_stats(self.key)
+
+
+_caches: list[ShipmentCache] = []
+
+
+async def invalidate_shipments(*ids: UUID):
+    # Drops the entries of every cache in a single DEL
+    await delete_cached_shipments([cache.key for cache in _caches], list(ids))
+
+
+async def cache_stats() -> dict[str, dict[str, int]]:
+    return {cache.namespace: await cache.stats() for cache in _caches}
+
+
+# v2: encoded by app.schemas.encoders, GetShipment carries a partner summary
+shipment_cache = ShipmentCache("shipment", version=2)
+tracking_page_cache = ShipmentCache("track_html", ttl=3600)
+tracking_json_cache = ShipmentCache("track_json", version=2, ttl=3600)
@@ -1,10 +1,19 @@
 
+from datetime import datetime
 from random import randint
+from uuid import UUID, uuid4
 
-from app.database.models import Shipment, ShipmentEvent
-from app.database.redis import add_shipment_verification_code
-from app.schemas.shipment import ShipmentStatus
+from celery import Signature, group
+from sqlalchemy import func, insert, update
+
+from app.database.models import DeliveryPartner, Shipment, ShipmentEvent
+from app.database.redis import add_shipment_verification_code, add_shipment_verification_codes, publish_shipment_events
+from app.schemas.enums import CLOSED_STATUSES
+from app.schemas.shipment import ShipmentEventRead, ShipmentStatus, TrackEvent
 from app.services.base import BaseService
+from app.services.shipment_cache import invalidate_shipments
+from app.services.shipment_stats import ShipmentStatsService, StatusDeltas
+from app.services.webhook import WebhookService
 from app.config import app_settings
 from app.utils import generate_url_safe_token
 from app.worker.tasks import send_sms, send_templated_email
@@ -13,28 +22,183 @@ from app.worker.tasks import send_sms, send_templated_email
 class ShipmentEventService(BaseService):
     def __init__(self, session):
         super().__init__(ShipmentEvent, session)
+        self.stats = ShipmentStatsService(session)
+        self.webhooks = WebhookService(session)
+        # Live messages of batch inserts, published once the caller commits
+        self._unpublished: list[str] = []
+        # Notifications of batch inserts, sent once the caller commits
+        self._codes: dict[UUID, int] = {}
+        self._unsent: list[Signature] = []
 
     async def add(self, shipment: Shipment, location: int = None, status: ShipmentStatus = None, description=None) -> ShipmentEvent:
+        # Missing values carry over from the shipment's latest event
+        location = location if location else shipment.current_location
+        status = status if status else shipment.current_status
+
         shipment_event = ShipmentEvent(
+            id=uuid4(),
+            created_at=datetime.now(),
             shipment_id=shipment.id,
             location=location,
             status=status,
             description=description if description else await self._generate_description(status, location)
         )
-        if not location or not status:
-            last_event = await self.get_latest_event(shipment)
-            if last_event:
-                location = location if location else last_event.location
-                status = status if status else last_event.status
+
+        # Committed together with the event below
+        await self._update_partner_load(shipment, status)
+        deltas = StatusDeltas()
+        self._count_status_change(deltas, shipment, status)
+        await self.stats.apply(deltas)
+        shipment.current_status = status
+        shipment.current_location = location
+        shipment.bump_version()
+        self.session.add(shipment)
+
+        await self.webhooks.queue([(shipment.seller_id, self._webhook_payload(shipment_event))])
 
         await self._notify(shipment, status)
 
-        return await self._add(shipment_event)
+        shipment_event = await self._add(shipment_event)
+        await invalidate_shipments(shipment_event.shipment_id)
+        await publish_shipment_events([self._live_message(shipment_event)])
+        await self.webhooks.schedule_queued()
+        return shipment_event
+
+    async def add_batch(self, changes: list[tuple[Shipment, dict]]):
+        # Events for many shipments in one multi-row INSERT,
+        # committed by the caller with the shipment updates
+        events = []
+        notifications = []
+        partner_load = {}
+        status_counts = StatusDeltas()
+        for shipment, change in changes:
+            location = change.get("location") or shipment.current_location
+            status = change.get("status") or shipment.current_status
+            description = change.get("description")
+            events.append({
+                "id": uuid4(),
+                "shipment_id": shipment.id,
+                "location": location,
+                "status": status,
+                "description": description if description else await self._generate_description(status, location),
+                "created_at": datetime.now(),
+            })
+
+            delta = self._load_delta(shipment, status)
+            if delta:
+                partner_id = shipment.delivery_partner_id
+                partner_load[partner_id] = partner_load.get(partner_id, 0) + delta
+            self._count_status_change(status_counts, shipment, status)
+
+            shipment.current_status = status
+            shipment.current_location = location
+            shipment.bump_version()
+            notifications.append((shipment, status))
+
+        for partner_id, delta in partner_load.items():
+            await self._change_partner_load(partner_id, delta)
+        await self.stats.apply(status_counts)
+        await self.session.execute(insert(ShipmentEvent), events)
+        self._unpublished.extend(self._live_message(event) for event in events)
+        await self.webhooks.queue([
+            (shipment.seller_id, self._webhook_payload(event))
+            for (shipment, _), event in zip(changes, events)
+        ])
+        # Built now, the shipments expire with the commit
+        self.prepare_notifications(notifications)
+
+    async def after_commit(self):
+        # Called by the owner of the transaction once batch
+        # inserts are committed, sends what they left pending
+        messages, self._unpublished = self._unpublished, []
+        if messages:
+            await publish_shipment_events(messages)
+        await self.webhooks.schedule_queued()
+        await self.send_notifications()
+
+    def _webhook_payload(self, event: ShipmentEvent | dict) -> str:
+        return ShipmentEventRead.model_validate(event).model_dump_json()
+
+    def _live_message(self, event: ShipmentEvent | dict) -> str:
+        # Shipment id up front so subscribers route without parsing json
+        shipment_id = event["shipment_id"] if isinstance(event, dict) else event.shipment_id
+        return f"{shipment_id}|{TrackEvent.model_validate(event).model_dump_json()}"
+
+    def _count_status_change(self, deltas: StatusDeltas, shipment: Shipment, status: ShipmentStatus):
+        self.stats.count_change(deltas, shipment.seller_id, shipment.delivery_partner_id,
+                                shipment.current_status, status)
+
+    def _load_delta(self, shipment: Shipment, status: ShipmentStatus) -> int:
+        # New shipments are counted when the partner is assigned
+        if shipment.current_status is None or not shipment.delivery_partner_id:
+            return 0
+
+        was_active = shipment.current_status not in CLOSED_STATUSES
+        is_active = status not in CLOSED_STATUSES
+        if was_active == is_active:
+            return 0
+        return 1 if is_active else -1
+
+    async def _update_partner_load(self, shipment: Shipment, status: ShipmentStatus):
+        delta = self._load_delta(shipment, status)
+        if delta:
+            await self._change_partner_load(shipment.delivery_partner_id, delta)
+
+    async def _change_partner_load(self, partner_id: UUID, delta: int):
+        await self.session.execute(
+            update(DeliveryPartner)
+            .where(DeliveryPartner.id == partner_id)
+            .values(active_shipment_count=func.greatest(
+                DeliveryPartner.active_shipment_count + delta, 0))
+            .execution_options(synchronize_session=False)
+        )
 
-    async def get_latest_event(self, shipment: Shipment):
-        if not shipment.timeline:
-            return None
-        return sorted(shipment.timeline, key=lambda item: item.created_at)[-1]
+    async def add_many(self, shipments: list[dict], location: int, status: ShipmentStatus, description=None):
+        # Events for newly inserted shipment rows in a single multi-row
+        # INSERT, committed by the caller with the rest of its transaction
+        description = description if description else await self._generate_description(status, location)
+        events = [
+            {
+                "id": uuid4(),
+                "shipment_id": shipment["id"],
+                "location": location,
+                "status": status,
+                "description": description,
+                "created_at": datetime.now(),
+            }
+            for shipment in shipments
+        ]
+        await self.session.execute(insert(ShipmentEvent), events)
+        self._unpublished.extend(self._live_message(event) for event in events)
+        await self.webhooks.queue([
+            (shipment["seller_id"], self._webhook_payload(event))
+            for shipment, event in zip(shipments, events)
+        ])
+
+        status_counts = StatusDeltas()
+        for shipment in shipments:
+            self.stats.count_change(status_counts, shipment["seller_id"],
+                                    shipment["delivery_partner_id"], None, status)
+        await self.stats.apply(status_counts)
+
+    def notify_placed_many(self, shipments: list[dict]):
+        # One round trip to the broker for the whole batch
+        group(
+            send_templated_email.s(**self._placed_email(**shipment))
+            for shipment in shipments
+        ).apply_async()
+
+    def _placed_email(self, shipment_id: UUID, email: str, seller: str, delivery_partner: str) -> dict:
+        return {
+            "subject": "Your shipment has been placed 📦",
+            "recipients": [email],
+            "context": {
+                "shipment_id": shipment_id,
+                "seller": seller,
+                "delivery_partner": delivery_partner
+            },
+            "template_name": "mail_placed.html",
+        }
 
     async def _generate_description(self, status: ShipmentStatus, location: int):
         desc_map = {
@@ -56,15 +220,50 @@ class ShipmentEventService(BaseService):
         return await self._add(shipment_event)
 
     async def _notify(self, shipment: Shipment, status: ShipmentStatus):
+        code = None
+        if status == ShipmentStatus.out_for_delivery:
+            code = randint(100_000, 999_999)
+            await add_shipment_verification_code(shipment.id, code)
+
+        for message in self._messages(shipment, status, code):
+            message.delay()
+
+    def prepare_notifications(self, changes: list[tuple[Shipment, ShipmentStatus]]):
+        # Nothing leaves the process until send_notifications, so a
+        # rolled back batch neither mails clients nor stores codes
+        codes = {
+            shipment.id: randint(100_000, 999_999)
+            for shipment, status in changes
+            if status == ShipmentStatus.out_for_delivery
+        }
+        self._codes.update(codes)
+        self._unsent.extend(
+            message
+            for shipment, status in changes
+            for message in self._messages(shipment, status, codes.get(shipment.id))
+        )
+
+    async def send_notifications(self):
+        # Verification codes in one redis round trip
+        # and every message in one celery group
+        codes, self._codes = self._codes, {}
+        if codes:
+            await add_shipment_verification_codes(codes)
+
+        messages, self._unsent = self._unsent, []
+        if messages:
+            group(messages).apply_async()
+
+    def _messages(self, shipment: Shipment, status: ShipmentStatus, code: int | None = None) -> list[Signature]:
+        messages = []
         match status:
             case ShipmentStatus.placed:
-                subject = "Your shipment has been placed 📦"
-                context = {
-                    "shipment_id": shipment.id,
-                    "seller": shipment.seller.name,
-                    "delivery_partner": shipment.delivery_partner.name
-                }
-                template_name = "mail_placed.html"
+                return [send_templated_email.s(**self._placed_email(
+                    shipment.id,
+                    shipment.client_contact_email,
+                    shipment.seller.name,
+                    shipment.delivery_partner.name,
+                ))]
 
             case ShipmentStatus.delivered:
                 subject = "Your shipment has been delivered 🛳"
@@ -91,22 +290,19 @@ class ShipmentEventService(BaseService):
                     "delivery_partner": shipment.delivery_partner.name
                 }
                 template_name = "mail_out_for_delivery.html"
-                code = randint(100_000, 999_999)
-
-                await add_shipment_verification_code(shipment.id, code)
 
                 if shipment.client_contact_phone:
-                    send_sms.delay(
+                    messages.append(send_sms.s(
                         to_number=shipment.client_contact_phone,
                         body=f"Your verification code for delivery of shipment {shipment.id} is {code}."
-                    )
+                    ))
                 else:
                     context["verification_code"] = code
             case _:
-                return  # No notification for other statuses
-        send_templated_email.delay(
+                return []  # No notification for other statuses
+        return messages + [send_templated_email.s(
             subject=subject,
             recipients=[shipment.client_contact_email],
             context=context,
             template_name=template_name
-        )
+        )]
@@ -0,0 +1,129 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, text, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.database.models import Shipment, ShipmentEvent, ShipmentEventArchive
+from app.schemas.enums import CLOSED_STATUSES
+from app.services.base import BaseService
+
+_EVENT_COLUMNS = ("id", "created_at", "location", "status", "description", "shipment_id")
+
+
+def _month(moment: datetime, offset: int = 0) -> datetime:
+    # First day of the month, offset months from moment's
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+logger = logging.getLogger(__name__)
+
+
+class ShipmentEventArchiveService(BaseService):
+    """Partition upkeep and archival of shipment_events
+
+    Events are range partitioned by month on created_at. Events of
+    shipments closed longer than archive_after ago are moved to
+    shipment_events_archive, which only detail and tracking reads
+    of those shipments touch.
+    """
+
+    def __init__(self, session, archive_after: timedelta = timedelta(days=90), batch_size: int = 500):
+        super().__init__(ShipmentEventArchive, session)
+        self.archive_after = archive_after
+        self.batch_size = batch_size
+
+    async def ensure_partitions(self, months_ahead: int = 2):
+        # Current and upcoming months, anything outside of
+        # them ends up in the default partition
+        try:
+            await self.session.execute(text(
+                "CREATE TABLE IF NOT EXISTS shipment_events_default "
+                "PARTITION OF shipment_events DEFAULT"
+            ))
+            await self.session.commit()
+        except SQLAlchemyError:
+            await self.session.rollback()
+            logger.exception("Failed to add the default shipment_events partition")
+            return
+
+        for offset in range(months_ahead + 1):
+            start, end = _month(datetime.now(), offset), _month(datetime.now(), offset + 1)
+            try:
+                await self._add_partition(start, end)
+            except SQLAlchemyError:
+                # Events of that month keep going to the default
+                # partition, the next run tries again
+                await self.session.rollback()
+                logger.exception("Failed to add the shipment_events partition for %s", f"{start:%Y-%m}")
+
+    async def _add_partition(self, start: datetime, end: datetime):
+        name = f"shipment_events_{start:%Y_%m}"
+        if await self.session.scalar(text(f"SELECT to_regclass('{name}') IS NOT NULL")):
+            return
+
+        bounds = f"FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        in_range = f"created_at >= '{start:%Y-%m-%d}' AND created_at < '{end:%Y-%m-%d}'"
+        stranded = await self.session.scalar(text(
+            f"SELECT EXISTS (SELECT 1 FROM shipment_events_default WHERE {in_range})"
+        ))
+        if not stranded:
+            await self.session.execute(text(
+                f"CREATE TABLE {name} PARTITION OF shipment_events FOR VALUES {bounds}"
+            ))
+        else:
+            # Postgres refuses the partition while the default holds rows
+            # of its range, move them over before attaching it. All in
+            # one transaction, readers never miss the moved events.
+            await self.session.execute(text(
+                f"CREATE TABLE {name} (LIKE shipment_events INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            await self.session.execute(text(
+                f"WITH moved AS (DELETE FROM shipment_events_default WHERE {in_range} RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ))
+            await self.session.execute(text(
+                f"ALTER TABLE shipment_events ATTACH PARTITION {name} FOR VALUES {bounds}"
+            ))
+        await self.session.commit()
+
+    async def archive_closed(self) -> int:
+        # One transaction per batch, so an interrupted run keeps
+        # what it moved and the next run carries on from there
+        cutoff = datetime.now() - self.archive_after
+        recent_events = select(ShipmentEvent.id).where(
+            ShipmentEvent.shipment_id == Shipment.id,
+            ShipmentEvent.created_at >= cutoff,
+        )
+        batch = (
+            select(Shipment.id)
+            .where(
+                Shipment.current_status.in_(CLOSED_STATUSES),
+                Shipment.events_archived.is_(False),
+                ~recent_events.exists(),
+            )
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        )
+
+        archived = 0
+        while ids := (await self.session.scalars(batch)).all():
+            moved = (
+                delete(ShipmentEvent)
+                .where(ShipmentEvent.shipment_id.in_(ids))
+                .returning(*(ShipmentEvent.__table__.c[name] for name in _EVENT_COLUMNS))
+                .cte("moved")
+            )
+            await self.session.execute(
+                insert(ShipmentEventArchive).from_select(_EVENT_COLUMNS, select(moved))
+            )
+            await self.session.execute(
+                update(Shipment)
+                .where(Shipment.id.in_(ids))
+                .values(events_archived=True)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+            archived += len(ids)
+        return archived
@@ -0,0 +1,100 @@
+from collections import Counter
+from uuid import UUID
+
+from sqlalchemy import delete, func, literal, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database.models import Shipment, ShipmentStatusCount
+from app.schemas.enums import CLOSED_STATUSES
+from app.schemas.shipment import ShipmentStats, ShipmentStatus
+from app.services.base import BaseService
+
+# (owner, owner_id, status) -> change in count
+StatusDeltas = Counter[tuple[str, UUID, ShipmentStatus]]
+
+
+class ShipmentStatsService(BaseService):
+    def __init__(self, session):
+        super().__init__(ShipmentStatusCount, session)
+
+    def count_change(self, deltas: StatusDeltas, seller_id: UUID, delivery_partner_id: UUID | None,
+                     old: ShipmentStatus | None, new: ShipmentStatus, count: int = 1):
+        # Move shipments from their old status to the new one
+        # in the seller's and the partner's counts
+        if old == new:
+            return
+        owners = [("seller", seller_id)]
+        if delivery_partner_id:
+            owners.append(("partner", delivery_partner_id))
+        for owner, owner_id in owners:
+            if old is not None:
+                deltas[(owner, owner_id, old)] -= count
+            deltas[(owner, owner_id, new)] += count
+
+    async def apply(self, deltas: StatusDeltas):
+        # One upsert for the whole batch, committed by the caller. Rows are
+        # sorted so concurrent transactions lock them in the same order.
+        rows = [
+            {"owner": owner, "owner_id": owner_id, "status": status, "count": delta}
+            for (owner, owner_id, status), delta in sorted(deltas.items())
+            if delta
+        ]
+        if not rows:
+            return
+
+        statement = insert(ShipmentStatusCount).values(rows)
+        await self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["owner", "owner_id", "status"],
+                set_={"count": ShipmentStatusCount.count + statement.excluded.count},
+            )
+        )
+
+    async def get(self, owner: str, owner_id: UUID) -> ShipmentStats:
+        result = await self.session.execute(
+            select(ShipmentStatusCount.status, ShipmentStatusCount.count)
+            .where(
+                ShipmentStatusCount.owner == owner,
+                ShipmentStatusCount.owner_id == owner_id,
+            )
+        )
+        counts = {status: 0 for status in ShipmentStatus}
+        counts.update(result.tuples().all())
+        return ShipmentStats(
+            counts=counts,
+            total=sum(counts.values()),
+            active=sum(count for status, count in counts.items()
+                       if status not in CLOSED_STATUSES),
+        )
+
+    async def rebuild(self) -> int:
+        # Recompute every count from the shipments table in one
+        # INSERT ... SELECT. Writers wait on the table lock, so no
+        # delta is applied between the delete and the insert.
+        await self.session.execute(
+            text("LOCK TABLE shipment_status_counts IN EXCLUSIVE MODE"))
+        await self.session.execute(delete(ShipmentStatusCount))
+
+        def counts(owner: str, owner_id):
+            return (
+                select(
+                    literal(owner),
+                    owner_id,
+                    Shipment.current_status,
+                    func.count(),
+                )
+                .where(owner_id.is_not(None), Shipment.current_status.is_not(None))
+                .group_by(owner_id, Shipment.current_status)
+            )
+
+        result = await self.session.execute(
+            insert(ShipmentStatusCount).from_select(
+                ["owner", "owner_id", "status", "count"],
+                union_all(
+                    counts("seller", Shipment.seller_id),
+                    counts("partner", Shipment.delivery_partner_id),
+                ),
+            )
+        )
+        await self.session.commit()
+        return result.rowcount
@@ -0,0 +1,34 @@
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import EntityNotFound
+from app.database.models import Tag
+from app.schemas.enums import TagNames
+
+
+class TagRegistry:
+    """Process local TagNames -> tag id map
+
+    Tags are seeded by migrations and don't change at runtime,
+    so the table is read once at startup (or on first use).
+    """
+
+    def __init__(self):
+        self._ids: dict[TagNames, UUID] = {}
+
+    async def load(self, session: AsyncSession):
+        result = await session.execute(select(Tag.id, Tag.name))
+        self._ids = {name: id for id, name in result}
+
+    async def ids(self, session: AsyncSession, *tag_names: TagNames) -> list[UUID]:
+        if not self._ids:
+            await self.load(session)
+        try:
+            return [self._ids[tag_name] for tag_name in tag_names]
+        except KeyError:
+            raise EntityNotFound()
+
+
+tag_registry = TagRegistry()
@@ -7,16 +7,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.worker.tasks import send_templated_email
 
 from .base import BaseService
+from .principals import principal_cache
 from fastapi import HTTPException, status
-from passlib.context import CryptContext
 from app.config import app_settings
+from app.core.passwords import password_hasher
 
 from app.utils import decode_url_safe_token, generate_access_token, generate_url_safe_token
 
-password_context = CryptContext(schemes=["bcrypt"])
-
-
 class UserService(BaseService):
+    # Role claim added to access tokens ("seller" or "partner")
+    role: str
+
     def __init__(self, model: User, session: AsyncSession):
         self.session = session
         self.model = model
@@ -25,7 +26,7 @@ class UserService(BaseService):
 
         user = self.model(
             **data,
-            password_hash=password_context.hash(data['password'])
+            password_hash=await password_hasher.hash(data['password'])
         )
         new_user = await self._add(user)
         token = generate_url_safe_token(
@@ -66,6 +67,7 @@ class UserService(BaseService):
             )
         user.email_verified = True
         await self._update(user)
+        principal_cache.invalidate(user.id)
         return user
 
     async def send_password_reset_link(self, email, router_prefix):
@@ -98,7 +100,7 @@ class UserService(BaseService):
         user_id = UUID(decoded_token['id'])
         user = await self._get(user_id)
 
-        user.password_hash = password_context.hash(password)
+        user.password_hash = await password_hasher.hash(password)
 
         await self._update(user)
 
@@ -106,7 +108,7 @@ class UserService(BaseService):
         # Validate the credentials
         user = await self._get_by_email(email)
 
-        if user is None or not password_context.verify(password, user.password_hash):
+        if user is None or not await password_hasher.verify(password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Email or password is incorrect"
@@ -122,6 +124,7 @@ class UserService(BaseService):
             "user": {
                 "name": user.name,
                 "id": str(user.id)
-            }
+            },
+            "role": self.role
         })
         return token
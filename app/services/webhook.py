@@ -0,0 +1,144 @@
+import secrets
+from datetime import datetime, timedelta
+from typing import Sequence
+from uuid import UUID
+
+from sqlalchemy import String, column, delete, distinct, exists, insert, or_, select, update, values
+from sqlalchemy.dialects import postgresql
+
+from app.core.exceptions import EntityNotFound
+from app.database.models import WebhookEvent, WebhookSubscription
+from app.database.redis import schedule_webhook_batches
+from app.schemas.webhook import CreateWebhook
+from app.services.base import BaseService
+from app.worker.tasks import dispatch_seller_webhooks
+
+# Events of a seller arriving within this many seconds go out together
+BATCH_WINDOW = 5
+# Events per delivery, the rest go out in a follow up batch
+BATCH_SIZE = 500
+# Seconds before events claimed by a dispatch that never
+# finished are taken again
+CLAIM_TIMEOUT = 300
+
+
+class WebhookService(BaseService):
+    def __init__(self, session):
+        super().__init__(WebhookSubscription, session)
+        # Sellers with queued events, scheduled once the caller commits
+        self._queued: set[UUID] = set()
+
+    async def subscribe(self, seller_id: UUID, webhook: CreateWebhook) -> WebhookSubscription:
+        return await self._add(WebhookSubscription(
+            seller_id=seller_id,
+            url=str(webhook.url),
+            secret=secrets.token_urlsafe(32),
+        ))
+
+    async def get_all(self, seller_id: UUID) -> Sequence[WebhookSubscription]:
+        result = await self.session.scalars(
+            select(WebhookSubscription)
+            .where(WebhookSubscription.seller_id == seller_id)
+            .order_by(WebhookSubscription.created_at)
+        )
+        return result.all()
+
+    async def unsubscribe(self, seller_id: UUID, id: UUID):
+        subscription = await self._get(id)
+        if subscription is None or subscription.seller_id != seller_id:
+            raise EntityNotFound()
+        await self._delete(subscription)
+
+    async def get_active(self, id: UUID) -> WebhookSubscription | None:
+        subscription = await self._get(id)
+        if subscription is None or not subscription.active:
+            return None
+        return subscription
+
+    async def queue(self, events: list[tuple[UUID, str]]):
+        # (seller id, payload) pairs into the outbox, in one INSERT that
+        # skips sellers without an active subscription
+        if not events:
+            return
+        rows = values(
+            column("seller_id", postgresql.UUID),
+            column("payload", String),
+            name="queued",
+        ).data(events)
+        result = await self.session.execute(
+            insert(WebhookEvent)
+            .from_select(
+                ["seller_id", "payload"],
+                select(rows.c.seller_id, rows.c.payload).where(
+                    exists().where(
+                        WebhookSubscription.seller_id == rows.c.seller_id,
+                        WebhookSubscription.active,
+                    )
+                ),
+            )
+            .returning(WebhookEvent.seller_id)
+        )
+        self._queued.update(result.scalars())
+
+    async def schedule_queued(self):
+        # One delivery task per seller per window, later events
+        # within the window join the batch already scheduled
+        queued, self._queued = self._queued, set()
+        for seller_id in await schedule_webhook_batches(queued, BATCH_WINDOW):
+            dispatch_seller_webhooks.apply_async((str(seller_id),), countdown=BATCH_WINDOW)
+
+    async def take_batch(self, seller_id: UUID, limit: int = BATCH_SIZE) -> tuple[list[UUID], list[int], list[str]]:
+        # Claims up to limit queued events of the seller, returned with
+        # the subscriptions they go to. Claimed events stay in the outbox
+        # until delete_batch, so a dispatch that dies doesn't lose them.
+        now = datetime.now()
+        batch = (
+            select(WebhookEvent.id)
+            .where(
+                WebhookEvent.seller_id == seller_id,
+                or_(
+                    WebhookEvent.claimed_at.is_(None),
+                    WebhookEvent.claimed_at < now - timedelta(seconds=CLAIM_TIMEOUT),
+                ),
+            )
+            .order_by(WebhookEvent.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(batch))
+            .values(claimed_at=now)
+            .returning(WebhookEvent.id, WebhookEvent.payload)
+        )
+        events = sorted(result.tuples())
+
+        subscriptions = await self.session.scalars(
+            select(WebhookSubscription.id).where(
+                WebhookSubscription.seller_id == seller_id,
+                WebhookSubscription.active,
+            )
+        )
+        subscription_ids = subscriptions.all()
+        await self.session.commit()
+        return subscription_ids, [id for id, _ in events], [payload for _, payload in events]
+
+    async def delete_batch(self, ids: list[int]):
+        await self.session.execute(delete(WebhookEvent).where(WebhookEvent.id.in_(ids)))
+        await self.session.commit()
+
+    async def schedule_stale(self) -> int:
+        # Sellers with events a dispatch claimed and never finished,
+        # or that were never dispatched (broker down after commit)
+        result = await self.session.scalars(
+            select(distinct(WebhookEvent.seller_id)).where(
+                or_(
+                    WebhookEvent.claimed_at.is_(None),
+                    WebhookEvent.claimed_at < datetime.now() - timedelta(seconds=CLAIM_TIMEOUT),
+                )
+            )
+        )
+        self._queued.update(result.all())
+        count = len(self._queued)
+        await self.schedule_queued()
+        return count
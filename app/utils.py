@@ -1,3 +1,5 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import uuid
@@ -52,3 +54,15 @@ def decode_access_token(token: str):
         )
     except jwt.PyJWTError:
         return None
+
+
+def encode_cursor(sort_key: datetime, id: uuid.UUID) -> str:
+    return urlsafe_b64encode(f"{sort_key.isoformat()}|{id.hex}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID] | None:
+    try:
+        sort_key, id = urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(sort_key), uuid.UUID(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
@@ -29,6 +29,29 @@ app = Celery(
     broker_connection_retry_on_startup=True,
 )
 
+app.conf.beat_schedule = {
+    "reconcile-partner-capacity": {
+        "task": "app.worker.tasks.reconcile_partner_capacity",
+        "schedule": 15 * 60,
+    },
+    "ensure-event-partitions": {
+        "task": "app.worker.tasks.ensure_event_partitions",
+        "schedule": 24 * 60 * 60,
+    },
+    "archive-closed-shipments": {
+        "task": "app.worker.tasks.archive_closed_shipments",
+        "schedule": 24 * 60 * 60,
+    },
+    "schedule-stale-webhooks": {
+        "task": "app.worker.tasks.schedule_stale_webhooks",
+        "schedule": 5 * 60,
+    },
+    "rebuild-delivery-estimates": {
+        "task": "app.worker.tasks.rebuild_delivery_estimates",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
 
 @app.task
 def send_mail(subject: str, recipients: list[str], body: str):
@@ -65,3 +88,139 @@ def send_sms(to_number: str, body: str):
         to=to_number
     )
     return message.sid
+
+
+@app.task
+def reconcile_partner_capacity():
+    # Imported here, services import this module for the tasks above
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def reconcile():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.delivery_partner.reconcile_capacity()
+
+    return async_to_sync(reconcile)()
+
+
+# Not scheduled, run after restores or manual data fixes:
+# celery -A app.worker.tasks call app.worker.tasks.rebuild_shipment_stats
+@app.task
+def rebuild_shipment_stats():
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def rebuild():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.shipment_event.stats.rebuild()
+
+    return async_to_sync(rebuild)()
+
+
+@app.task
+def ensure_event_partitions():
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def ensure():
+        async with ServiceFactory(bind=worker_engine) as service:
+            await service.shipment_event_archive.ensure_partitions()
+
+    async_to_sync(ensure)()
+
+
+@app.task
+def archive_closed_shipments():
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def archive():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.shipment_event_archive.archive_closed()
+
+    return async_to_sync(archive)()
+
+
+@app.task
+def rebuild_delivery_estimates():
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def rebuild():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.delivery_estimate.rebuild()
+
+    return async_to_sync(rebuild)()
+
+
+@app.task
+def dispatch_seller_webhooks(seller_id: str):
+    from uuid import UUID
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+    from app.services.webhook import BATCH_SIZE
+
+    async def take():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.webhook.take_batch(UUID(seller_id))
+
+    async def done(event_ids):
+        async with ServiceFactory(bind=worker_engine) as service:
+            await service.webhook.delete_batch(event_ids)
+
+    subscription_ids, event_ids, payloads = async_to_sync(take)()
+    if not event_ids:
+        return 0
+    if len(event_ids) == BATCH_SIZE:
+        dispatch_seller_webhooks.delay(seller_id)
+
+    # Payloads are already json
+    body = f'{{"seller_id": "{seller_id}", "events": [{", ".join(payloads)}]}}'
+    for subscription_id in subscription_ids:
+        send_webhook.delay(str(subscription_id), body)
+
+    # Out of the outbox only once every delivery is queued,
+    # otherwise the claim expires and schedule_stale retries
+    async_to_sync(done)(event_ids)
+    return len(event_ids)
+
+
+@app.task
+def send_webhook(subscription_id: str, body: str, attempt: int = 0):
+    from uuid import UUID
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+    from app.worker import webhooks
+
+    # Endpoint and secret are read on every attempt, so they stay out
+    # of the broker and a deleted subscription stops its retries
+    async def load():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.webhook.get_active(UUID(subscription_id))
+
+    subscription = async_to_sync(load)()
+    if subscription is None:
+        return None
+
+    try:
+        return webhooks.deliver(subscription_id, subscription.url, subscription.secret, body)
+    except (webhooks.EndpointBusy, webhooks.DeliveryFailed) as error:
+        attempt, delay = webhooks.retry_after(error, attempt)
+
+    send_webhook.apply_async(
+        (subscription_id, body),
+        {"attempt": attempt},
+        countdown=delay,
+    )
+
+
+@app.task
+def schedule_stale_webhooks():
+    from app.database.session import worker_engine
+    from app.services.factory import ServiceFactory
+
+    async def schedule():
+        async with ServiceFactory(bind=worker_engine) as service:
+            return await service.webhook.schedule_stale()
+
+    return async_to_sync(schedule)()
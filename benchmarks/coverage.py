@@ -0,0 +1,74 @@
+"""Partner lookup by zipcode, sequential scan vs CoverageIndex
+
+10k partners covering 1k random zipcodes each out of 100k. The scan
+checks every partner's zipcode array like any_(serviceable_zipcodes)
+did in Postgres, minus the I/O, so it's a lower bound for the old
+lookup.
+
+    python -m benchmarks.coverage
+"""
+import asyncio
+import random
+from time import perf_counter
+from uuid import uuid4
+
+from app.services.coverage import CoverageIndex
+
+PARTNERS = 10_000
+ZIPCODES_PER_PARTNER = 1_000
+ZIPCODES = 100_000
+LOOKUPS = 10_000
+
+
+class Rows:
+    # Stands in for the session, build only streams (id, zipcodes)
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def stream(self, query):
+        return self
+
+    async def __aiter__(self):
+        for row in self.rows:
+            yield row
+
+
+def scan(rows, zipcode):
+    return [partner_id for partner_id, zipcodes in rows if zipcode in zipcodes]
+
+
+def timed(function, zipcodes) -> float:
+    started = perf_counter()
+    for zipcode in zipcodes:
+        function(zipcode)
+    return (perf_counter() - started) / len(zipcodes)
+
+
+def main():
+    rng = random.Random(0)
+    # Reuse the same int objects across partners to keep memory sane
+    universe = list(range(10_000, 10_000 + ZIPCODES))
+    rows = [
+        (uuid4(), rng.sample(universe, ZIPCODES_PER_PARTNER))
+        for _ in range(PARTNERS)
+    ]
+    zipcodes = [rng.choice(universe) for _ in range(LOOKUPS)]
+
+    index = CoverageIndex()
+    started = perf_counter()
+    asyncio.run(index.build(Rows(rows)))
+    print(f"index build       {perf_counter() - started:10.3f} s")
+
+    # The scan is slow enough that a few lookups tell the story
+    sample = zipcodes[:20]
+    assert all(sorted(scan(rows, zipcode)) == sorted(index.lookup(zipcode)) for zipcode in sample)
+
+    old = timed(lambda zipcode: scan(rows, zipcode), sample)
+    new = timed(index.lookup, zipcodes)
+    print(f"sequential scan   {old * 1e6:10.1f} us/lookup")
+    print(f"coverage index    {new * 1e6:10.1f} us/lookup")
+    print(f"speedup           {old / new:10.0f} x")
+
+
+if __name__ == "__main__":
+    main()
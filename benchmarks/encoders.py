@@ -0,0 +1,96 @@
+"""Shipment responses, pydantic + jsonable_encoder vs the orjson encoders
+
+The old path is what FastAPI did with response_model: validate the
+ORM graph or rows into the schema, jsonable_encoder, json.dumps. The
+new one is app.schemas.encoders. Payloads are checked to decode to
+the same JSON before timing.
+
+    python -m benchmarks.encoders
+"""
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+from timeit import repeat
+from uuid import uuid4
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from app.database.models import DeliveryPartner, Seller, Shipment, ShipmentEvent, Tag
+from app.schemas.encoders import encode_page, encode_shipment
+from app.schemas.enums import ShipmentStatus, TagNames
+from app.schemas.shipment import GetShipment, ShipmentPage
+
+EVENTS = 8
+PAGE = 100
+
+ListRow = namedtuple("ListRow", [
+    "id", "content", "weight", "destination", "estimated_delivery",
+    "status", "created_at", "seller_id", "delivery_partner_id",
+])
+
+
+def shipment() -> Shipment:
+    now = datetime.now()
+    id = uuid4()
+    return Shipment(
+        id=id,
+        content="Books and paper",
+        weight=4.5,
+        destination=11042,
+        estimated_delivery=now + timedelta(days=3),
+        client_contact_email="client@example.com",
+        current_status=ShipmentStatus.in_transit,
+        created_at=now,
+        seller=Seller(id=uuid4(), name="Seller", email="seller@example.com",
+                      password_hash="", zip_code=11001),
+        delivery_partner=DeliveryPartner(id=uuid4(), name="Partner", email="partner@example.com",
+                                         password_hash="", max_handling_capacity=10,
+                                         serviceable_zipcodes=list(range(11000, 12000))),
+        tags=[Tag(id=uuid4(), name=TagNames.FRAGILE, instruction="Handle with care")],
+        live_timeline=[
+            ShipmentEvent(id=uuid4(), created_at=now + timedelta(hours=hour), location=11000 + hour,
+                          status=ShipmentStatus.in_transit, description="Scanned", shipment_id=id)
+            for hour in range(EVENTS)
+        ],
+    )
+
+
+def rows() -> list[ListRow]:
+    now = datetime.now()
+    return [
+        ListRow(uuid4(), "Books and paper", 4.5, 11042, now + timedelta(days=3),
+                ShipmentStatus.placed, now, uuid4(), uuid4())
+        for _ in range(PAGE)
+    ]
+
+
+def old_shipment(shipment: Shipment) -> bytes:
+    model = GetShipment.model_validate(shipment, from_attributes=True)
+    return json.dumps(jsonable_encoder(model)).encode()
+
+
+def old_page(rows: list[ListRow]) -> bytes:
+    model = ShipmentPage.model_validate({"items": rows, "next_cursor": None}, from_attributes=True)
+    return json.dumps(jsonable_encoder(model)).encode()
+
+
+def best(function, payload, number: int) -> float:
+    return min(repeat(lambda: function(payload), number=number, repeat=5)) / number
+
+
+def main():
+    detail, page = shipment(), rows()
+    assert json.loads(old_shipment(detail)) == orjson.loads(encode_shipment(detail))
+    assert json.loads(old_page(page)) == orjson.loads(encode_page(page, None))
+
+    for name, old, new, payload, number in (
+        (f"shipment detail, {EVENTS} events", old_shipment, encode_shipment, detail, 2_000),
+        (f"list page, {PAGE} rows", old_page, lambda rows: encode_page(rows, None), page, 200),
+    ):
+        old_time, new_time = best(old, payload, number=number), best(new, payload, number=number)
+        print(f"{name:28} {old_time * 1e6:10.1f} us  {new_time * 1e6:8.1f} us  {old_time / new_time:5.1f} x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Login burst, bcrypt on the event loop vs PasswordHasher
+
+A burst of concurrent logins checks passwords while a ticker stands
+in for the other requests on the same worker. Inline, every check
+holds the event loop for the whole bcrypt round, so the ticker (and
+any request) stalls behind the queue. Through the process pool only
+the logins wait.
+
+    python -m benchmarks.login
+"""
+import asyncio
+from time import perf_counter
+
+import numpy as np
+
+from app.core.passwords import PasswordHasher, password_context
+
+LOGINS = 40
+TICK = 0.01
+
+
+async def inline(password: str, password_hash: str) -> bool:
+    # What UserService did before PasswordHasher
+    return password_context.verify(password, password_hash)
+
+
+async def burst(verify, password_hash: str) -> tuple[np.ndarray, np.ndarray]:
+    logins, ticks = [], []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = perf_counter()
+            await asyncio.sleep(TICK)
+            ticks.append(perf_counter() - started - TICK)
+
+    async def login(arrived: float):
+        assert await verify("password", password_hash)
+        logins.append(perf_counter() - arrived)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 2)
+    # Every login of the burst arrives at once
+    arrived = perf_counter()
+    await asyncio.gather(*(login(arrived) for _ in range(LOGINS)))
+    done.set()
+    await task
+    return np.array(logins), np.array(ticks)
+
+
+def report(name: str, logins: np.ndarray, ticks: np.ndarray):
+    p50, p99 = np.percentile(logins, [50, 99]) * 1000
+    lag = np.percentile(ticks, 99) * 1000
+    print(f"{name:8} login p50 {p50:8.0f} ms  p99 {p99:8.0f} ms  other requests p99 {lag:8.0f} ms")
+
+
+async def main():
+    password_hash = password_context.hash("password")
+
+    report("inline", *await burst(inline, password_hash))
+
+    hasher = PasswordHasher(max_waiting=LOGINS)
+    # Start the workers outside the measurement
+    await hasher.verify("password", password_hash)
+    try:
+        report("pool", *await burst(hasher.verify, password_hash))
+        print(f"{hasher.workers} workers, peak waiting {hasher.peak_waiting}")
+    finally:
+        await hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""partner manifest index
+
+Revision ID: 0c6e9a4d27b1
+Revises: f41c8e2b6d93
+Create Date: 2026-10-18 14:15:33.071962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6e9a4d27b1'
+down_revision: Union[str, Sequence[str], None] = 'f41c8e2b6d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_shipments_partner_manifest', 'shipments',
+                    ['delivery_partner_id', 'destination', 'created_at'], unique=False,
+                    postgresql_include=['id', 'current_status', 'current_location',
+                                        'estimated_delivery', 'content', 'weight'],
+                    postgresql_where=sa.text("current_status NOT IN ('delivered', 'cancelled')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipments_partner_manifest', table_name='shipments')
@@ -0,0 +1,34 @@
+"""delivery estimates
+
+Revision ID: 3f8b1d6e0a52
+Revises: e6f0b4a8d215
+Create Date: 2026-10-18 18:04:11.532087
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8b1d6e0a52'
+down_revision: Union[str, Sequence[str], None] = 'e6f0b4a8d215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('delivery_estimates',
+                    sa.Column('origin', sa.INTEGER(), nullable=False),
+                    sa.Column('destination', sa.INTEGER(), nullable=False),
+                    sa.Column('delivery_partner_id', sa.UUID(), nullable=False),
+                    sa.Column('transit_seconds', sa.INTEGER(), nullable=False),
+                    sa.Column('samples', sa.INTEGER(), nullable=False),
+                    sa.PrimaryKeyConstraint('origin', 'destination', 'delivery_partner_id')
+                    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('delivery_estimates')
@@ -0,0 +1,41 @@
+"""partner active shipment count
+
+Revision ID: 5e91b0d3a7c4
+Revises: c7d2e8a41f36
+Create Date: 2026-10-18 10:48:37.220174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5e91b0d3a7c4'
+down_revision: Union[str, Sequence[str], None] = 'c7d2e8a41f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('delivery_partners',
+                  sa.Column('active_shipment_count', sa.INTEGER(),
+                            server_default='0', nullable=False))
+
+    op.execute("""
+        UPDATE delivery_partners
+        SET active_shipment_count = counts.active
+        FROM (
+            SELECT delivery_partner_id, count(*) AS active
+            FROM shipments
+            WHERE current_status NOT IN ('delivered', 'cancelled')
+            GROUP BY delivery_partner_id
+        ) AS counts
+        WHERE counts.delivery_partner_id = delivery_partners.id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('delivery_partners', 'active_shipment_count')
@@ -0,0 +1,143 @@
+"""partition shipment events
+
+Revision ID: 7a3d5c1e9f42
+Revises: 0c6e9a4d27b1
+Create Date: 2026-10-18 15:08:51.342716
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3d5c1e9f42'
+down_revision: Union[str, Sequence[str], None] = '0c6e9a4d27b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+COLUMNS = "id, created_at, location, status, description, shipment_id"
+
+
+def _status():
+    return postgresql.ENUM('placed', 'in_transit', 'out_for_delivery',
+                           'delivered', 'cancelled', name='shipmentstatus',
+                           create_type=False)
+
+
+def _month(moment: datetime, offset: int = 0) -> datetime:
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    partitioned = bind.scalar(sa.text(
+        "SELECT count(*) FROM pg_partitioned_table "
+        "WHERE partrelid = 'shipment_events'::regclass"))
+
+    # Skipped when resuming an interrupted data move
+    if not partitioned:
+        op.execute("ALTER TABLE shipment_events RENAME TO shipment_events_legacy")
+        op.execute("ALTER TABLE shipment_events_legacy "
+                   "RENAME CONSTRAINT shipment_events_pkey TO shipment_events_legacy_pkey")
+
+        op.create_table('shipment_events',
+                        sa.Column('id', sa.UUID(), nullable=False),
+                        sa.Column('created_at', postgresql.TIMESTAMP(), nullable=False),
+                        sa.Column('location', sa.INTEGER(), nullable=False),
+                        sa.Column('status', _status(), nullable=False),
+                        sa.Column('description', sa.VARCHAR(), nullable=True),
+                        sa.Column('shipment_id', sa.UUID(), nullable=False),
+                        sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id']),
+                        sa.PrimaryKeyConstraint('id', 'created_at'),
+                        postgresql_partition_by='RANGE (created_at)'
+                        )
+        op.create_index('ix_shipment_events_shipment_id_created_at', 'shipment_events',
+                        ['shipment_id', 'created_at'], unique=False)
+
+        # A partition per month of history plus the next two months
+        first = bind.scalar(sa.text(
+            "SELECT min(created_at) FROM shipment_events_legacy")) or datetime.now()
+        start, last = _month(first), _month(datetime.now(), 2)
+        while start <= last:
+            end = _month(start, 1)
+            op.execute(f"CREATE TABLE shipment_events_{start:%Y_%m} "
+                       f"PARTITION OF shipment_events "
+                       f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')")
+            start = end
+        op.execute("CREATE TABLE shipment_events_default "
+                   "PARTITION OF shipment_events DEFAULT")
+
+        op.create_table('shipment_events_archive',
+                        sa.Column('id', sa.UUID(), nullable=False),
+                        sa.Column('created_at', postgresql.TIMESTAMP(), nullable=True),
+                        sa.Column('location', sa.INTEGER(), nullable=False),
+                        sa.Column('status', _status(), nullable=False),
+                        sa.Column('description', sa.VARCHAR(), nullable=True),
+                        sa.Column('shipment_id', sa.UUID(), nullable=False),
+                        sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id']),
+                        sa.PrimaryKeyConstraint('id')
+                        )
+        op.create_index(op.f('ix_shipment_events_archive_shipment_id'), 'shipment_events_archive',
+                        ['shipment_id'], unique=False)
+
+        op.add_column('shipments',
+                      sa.Column('events_archived', sa.BOOLEAN(),
+                                server_default=sa.false(), nullable=False))
+
+    # Each batch commits on its own, rerunning the migration after
+    # an interruption picks up the rows still in the legacy table
+    with op.get_context().autocommit_block():
+        if bind.scalar(sa.text("SELECT to_regclass('shipment_events_legacy')")) is None:
+            return
+
+        moved = BATCH_SIZE
+        while moved:
+            # Events always got a created_at, the coalesce is only
+            # there to satisfy the new primary key
+            moved = bind.execute(sa.text(f"""
+                WITH batch AS (
+                    DELETE FROM shipment_events_legacy
+                    WHERE id IN (
+                        SELECT id FROM shipment_events_legacy LIMIT :batch_size
+                    )
+                    RETURNING {COLUMNS}
+                )
+                INSERT INTO shipment_events ({COLUMNS})
+                SELECT id, coalesce(created_at, 'epoch'), location, status, description, shipment_id
+                FROM batch
+            """), {"batch_size": BATCH_SIZE}).rowcount
+        op.execute("DROP TABLE shipment_events_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE shipment_events RENAME TO shipment_events_partitioned")
+    op.execute("ALTER TABLE shipment_events_partitioned "
+               "RENAME CONSTRAINT shipment_events_pkey TO shipment_events_partitioned_pkey")
+    op.create_table('shipment_events',
+                    sa.Column('id', sa.UUID(), nullable=False),
+                    sa.Column('created_at', postgresql.TIMESTAMP(), nullable=True),
+                    sa.Column('location', sa.INTEGER(), nullable=False),
+                    sa.Column('status', _status(), nullable=False),
+                    sa.Column('description', sa.VARCHAR(), nullable=True),
+                    sa.Column('shipment_id', sa.UUID(), nullable=False),
+                    sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id'],
+                                            name=op.f('shipment_events_shipment_id_fkey')),
+                    sa.PrimaryKeyConstraint('id', name=op.f('shipment_events_pkey'))
+                    )
+    op.execute(f"INSERT INTO shipment_events ({COLUMNS}) "
+               f"SELECT {COLUMNS} FROM shipment_events_partitioned "
+               f"UNION ALL SELECT {COLUMNS} FROM shipment_events_archive")
+
+    op.drop_column('shipments', 'events_archived')
+    op.drop_index(op.f('ix_shipment_events_archive_shipment_id'),
+                  table_name='shipment_events_archive')
+    op.drop_table('shipment_events_archive')
+    # Drops the partitions with it
+    op.drop_table('shipment_events_partitioned')
@@ -0,0 +1,29 @@
+"""webhook event claims
+
+Revision ID: 8c4e2a9f1d37
+Revises: 3f8b1d6e0a52
+Create Date: 2026-10-18 20:12:47.361902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2a9f1d37'
+down_revision: Union[str, Sequence[str], None] = '3f8b1d6e0a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('webhook_events',
+                  sa.Column('claimed_at', postgresql.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('webhook_events', 'claimed_at')
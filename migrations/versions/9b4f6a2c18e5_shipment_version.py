@@ -0,0 +1,29 @@
+"""shipment version
+
+Revision ID: 9b4f6a2c18e5
+Revises: 5e91b0d3a7c4
+Create Date: 2026-10-18 12:21:05.906417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4f6a2c18e5'
+down_revision: Union[str, Sequence[str], None] = '5e91b0d3a7c4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('shipments',
+                  sa.Column('version', sa.INTEGER(),
+                            server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('shipments', 'version')
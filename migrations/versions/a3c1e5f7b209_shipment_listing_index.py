@@ -0,0 +1,27 @@
+"""shipment listing index
+
+Revision ID: a3c1e5f7b209
+Revises: 78df1f318f42
+Create Date: 2026-10-18 09:12:40.114502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c1e5f7b209'
+down_revision: Union[str, Sequence[str], None] = '78df1f318f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_shipments_created_at_id', 'shipments',
+                    ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipments_created_at_id', table_name='shipments')
@@ -0,0 +1,38 @@
+"""shipment pings
+
+Revision ID: b85e2f0a7c19
+Revises: 7a3d5c1e9f42
+Create Date: 2026-10-18 15:52:26.918344
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b85e2f0a7c19'
+down_revision: Union[str, Sequence[str], None] = '7a3d5c1e9f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('shipment_pings',
+                    sa.Column('id', sa.BIGINT(), autoincrement=True, nullable=False),
+                    sa.Column('shipment_id', sa.UUID(), nullable=False),
+                    sa.Column('location', sa.INTEGER(), nullable=False),
+                    sa.Column('created_at', postgresql.TIMESTAMP(), nullable=False),
+                    sa.ForeignKeyConstraint(['shipment_id'], ['shipments.id']),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_shipment_pings_shipment_id_created_at', 'shipment_pings',
+                    ['shipment_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipment_pings_shipment_id_created_at', table_name='shipment_pings')
+    op.drop_table('shipment_pings')
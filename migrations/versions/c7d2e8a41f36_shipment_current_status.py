@@ -0,0 +1,51 @@
+"""shipment current status
+
+Revision ID: c7d2e8a41f36
+Revises: a3c1e5f7b209
+Create Date: 2026-10-18 10:02:11.583920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d2e8a41f36'
+down_revision: Union[str, Sequence[str], None] = 'a3c1e5f7b209'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('shipments',
+                  sa.Column('current_status', postgresql.ENUM('placed', 'in_transit', 'out_for_delivery',
+                                                              'delivered', 'cancelled', name='shipmentstatus',
+                                                              create_type=False), nullable=True))
+    op.add_column('shipments',
+                  sa.Column('current_location', sa.INTEGER(), nullable=True))
+
+    # Backfill from the latest event of every shipment
+    op.execute("""
+        UPDATE shipments
+        SET current_status = latest.status,
+            current_location = latest.location
+        FROM (
+            SELECT DISTINCT ON (shipment_id) shipment_id, status, location
+            FROM shipment_events
+            ORDER BY shipment_id, created_at DESC
+        ) AS latest
+        WHERE latest.shipment_id = shipments.id
+    """)
+
+    op.create_index(op.f('ix_shipments_current_status'), 'shipments',
+                    ['current_status'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_shipments_current_status'), table_name='shipments')
+    op.drop_column('shipments', 'current_location')
+    op.drop_column('shipments', 'current_status')
@@ -0,0 +1,37 @@
+"""shipment search indexes
+
+Revision ID: d2a7f3c95e10
+Revises: 9b4f6a2c18e5
+Create Date: 2026-10-18 13:02:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a7f3c95e10'
+down_revision: Union[str, Sequence[str], None] = '9b4f6a2c18e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_shipments_seller_id_created_at', 'shipments',
+                    ['seller_id', 'created_at'], unique=False)
+    op.create_index('ix_shipments_delivery_partner_id_current_status', 'shipments',
+                    ['delivery_partner_id', 'current_status'], unique=False)
+    op.create_index('ix_shipments_destination', 'shipments',
+                    ['destination'], unique=False)
+    op.create_index('ix_shipments_estimated_delivery', 'shipments',
+                    ['estimated_delivery'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_shipments_estimated_delivery', table_name='shipments')
+    op.drop_index('ix_shipments_destination', table_name='shipments')
+    op.drop_index('ix_shipments_delivery_partner_id_current_status',
+                  table_name='shipments')
+    op.drop_index('ix_shipments_seller_id_created_at', table_name='shipments')
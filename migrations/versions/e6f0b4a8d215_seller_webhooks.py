@@ -0,0 +1,53 @@
+"""seller webhooks
+
+Revision ID: e6f0b4a8d215
+Revises: b85e2f0a7c19
+Create Date: 2026-10-18 16:37:04.550281
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f0b4a8d215'
+down_revision: Union[str, Sequence[str], None] = 'b85e2f0a7c19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('webhook_subscriptions',
+                    sa.Column('id', sa.UUID(), nullable=False),
+                    sa.Column('seller_id', sa.UUID(), nullable=False),
+                    sa.Column('url', sa.VARCHAR(), nullable=False),
+                    sa.Column('secret', sa.VARCHAR(), nullable=False),
+                    sa.Column('active', sa.BOOLEAN(), nullable=False),
+                    sa.Column('created_at', postgresql.TIMESTAMP(), nullable=True),
+                    sa.ForeignKeyConstraint(['seller_id'], ['sellers.id']),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index(op.f('ix_webhook_subscriptions_seller_id'), 'webhook_subscriptions',
+                    ['seller_id'], unique=False)
+
+    op.create_table('webhook_events',
+                    sa.Column('id', sa.BIGINT(), autoincrement=True, nullable=False),
+                    sa.Column('seller_id', sa.UUID(), nullable=False),
+                    sa.Column('payload', sa.VARCHAR(), nullable=False),
+                    sa.ForeignKeyConstraint(['seller_id'], ['sellers.id']),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_webhook_events_seller_id_id', 'webhook_events',
+                    ['seller_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_webhook_events_seller_id_id', table_name='webhook_events')
+    op.drop_table('webhook_events')
+    op.drop_index(op.f('ix_webhook_subscriptions_seller_id'),
+                  table_name='webhook_subscriptions')
+    op.drop_table('webhook_subscriptions')
@@ -0,0 +1,49 @@
+"""shipment status counts
+
+Revision ID: f41c8e2b6d93
+Revises: d2a7f3c95e10
+Create Date: 2026-10-18 13:40:12.684205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41c8e2b6d93'
+down_revision: Union[str, Sequence[str], None] = 'd2a7f3c95e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('shipment_status_counts',
+                    sa.Column('owner', sa.VARCHAR(), nullable=False),
+                    sa.Column('owner_id', sa.UUID(), nullable=False),
+                    sa.Column('status', postgresql.ENUM('placed', 'in_transit', 'out_for_delivery',
+                                                        'delivered', 'cancelled', name='shipmentstatus',
+                                                        create_type=False), nullable=False),
+                    sa.Column('count', sa.INTEGER(), nullable=False),
+                    sa.PrimaryKeyConstraint('owner', 'owner_id', 'status')
+                    )
+
+    op.execute("""
+        INSERT INTO shipment_status_counts (owner, owner_id, status, count)
+        SELECT 'seller', seller_id, current_status, count(*)
+        FROM shipments
+        WHERE current_status IS NOT NULL
+        GROUP BY seller_id, current_status
+        UNION ALL
+        SELECT 'partner', delivery_partner_id, current_status, count(*)
+        FROM shipments
+        WHERE delivery_partner_id IS NOT NULL AND current_status IS NOT NULL
+        GROUP BY delivery_partner_id, current_status
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('shipment_status_counts')
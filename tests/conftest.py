@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+# Settings read at import time, placeholders unless .env or the
+# environment has the real ones (integration tests need those)
+_defaults = {
+    "POSTGRES_DB": "fastship",
+    "POSTGRES_USER": "postgres",
+    "POSTGRES_PASSWORD": "postgres",
+    "POSTGRES_SERVER": "localhost",
+    "POSTGRES_PORT": "5432",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "REDIS_USER": "default",
+    "REDIS_PASSWORD": "test",
+    "JWT_SECRET": "test-secret",
+    "JWT_ALGORITHM": "HS256",
+    "MAIL_USERNAME": "test",
+    "MAIL_PASSWORD": "test",
+    "MAIL_FROM": "test@example.com",
+    "MAIL_PORT": "587",
+    "MAIL_SERVER": "localhost",
+    "MAIL_FROM_NAME": "FastShip",
+    "TWILIO_SID": "test",
+    "TWILIO_AUTH_TOKEN": "test",
+    "TWILIO_NUMBER": "test",
+    "OPENAI_API_KEY": "test",
+}
+for name, value in _defaults.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture(scope="session")
+def postgres() -> str:
+    # Integration tests run against the database from the settings,
+    # skipped when it isn't reachable
+    from app.config import settings
+
+    async def ping():
+        engine = create_async_engine(settings.POSTGRES_URL, poolclass=NullPool)
+        try:
+            async with engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        finally:
+            await engine.dispose()
+
+    try:
+        asyncio.run(asyncio.wait_for(ping(), timeout=5))
+    except (OSError, TimeoutError, SQLAlchemyError) as error:
+        pytest.skip(f"Postgres unreachable: {error}")
+    return settings.POSTGRES_URL
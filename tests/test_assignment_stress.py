@@ -0,0 +1,139 @@
+import asyncio
+from time import perf_counter
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.exceptions import DeliveryPartnerNotAvailable
+from app.database.models import DeliveryPartner, Seller, Shipment, ShipmentEvent, ShipmentStatusCount
+from app.database.session import engine as app_engine
+from app.schemas.principal import Principal
+from app.schemas.shipment import CreateShipment
+from app.services import shipment_event
+from app.services.assignment import get_strategy
+from app.services.coverage import coverage_index
+from app.services.delivery_estimate import delivery_estimates
+from app.services.delivery_partner import DeliveryPartnerService, assignment_batcher
+from app.services.shipment import ShipmentService
+from app.services.shipment_event import ShipmentEventService
+from app.services.webhook import WebhookService
+
+pytestmark = pytest.mark.integration
+
+PARTNERS = 20
+CAPACITY = 10
+# More creates than slots, so the last ones race for a full pool
+REQUESTS = 300
+# Far below what a local Postgres manages, catches creates
+# serializing behind a single partner row
+MIN_THROUGHPUT = 50
+
+
+async def _nothing(*args, **kwargs):
+    pass
+
+
+@pytest.fixture
+def no_side_effects(monkeypatch):
+    # Creates still write everything to Postgres, only the redis
+    # and broker calls made after the commit are skipped
+    monkeypatch.setattr(ShipmentEventService, "_notify", _nothing)
+    monkeypatch.setattr(WebhookService, "schedule_queued", _nothing)
+    monkeypatch.setattr(shipment_event, "invalidate_shipments", _nothing)
+    monkeypatch.setattr(shipment_event, "publish_shipment_events", _nothing)
+
+
+async def create(sessions, strategy, seller: Principal, destination: int) -> bool:
+    # POST /shipment/ minus the request handling
+    async with sessions() as session:
+        service = ShipmentService(
+            session, DeliveryPartnerService(session, strategy), ShipmentEventService(session))
+        try:
+            await service.add(CreateShipment(
+                content="Stress test",
+                weight=1,
+                destination=destination,
+                client_contact_email="client@example.com",
+            ), seller)
+        except DeliveryPartnerNotAvailable:
+            return False
+        return True
+
+
+async def stress(url: str, strategy_name: str | None) -> tuple[int, float, list]:
+    engine = create_async_engine(url, pool_size=20, max_overflow=30)
+    # Expiring on commit like get_session's sessions
+    sessions = async_sessionmaker(engine)
+    # Unused zipcode, so only the partners made here cover it
+    destination = 90_000_000 + uuid4().int % 1_000_000
+    run = uuid4().hex
+    try:
+        async with sessions() as session:
+            principal = Principal(id=uuid4(), name="Stress seller", email_verified=True, zip_code=11001)
+            session.add(Seller(**principal.model_dump(), email=f"stress-seller-{run}@example.com", password_hash=""))
+            session.add_all(
+                DeliveryPartner(name="Stress partner", email=f"stress-partner-{run}-{index}@example.com",
+                                password_hash="", serviceable_zipcodes=[destination],
+                                max_handling_capacity=CAPACITY)
+                for index in range(PARTNERS)
+            )
+            await session.commit()
+            # Loaded up front, nothing waits on their locks below
+            coverage_index.invalidate()
+            await coverage_index.ensure(session)
+            await delivery_estimates.load(session)
+
+        strategy = get_strategy(strategy_name) if strategy_name else None
+        started = perf_counter()
+        created = await asyncio.gather(*(
+            create(sessions, strategy, principal, destination) for _ in range(REQUESTS)
+        ))
+        elapsed = perf_counter() - started
+
+        async with sessions() as session:
+            partners = (await session.execute(
+                select(
+                    DeliveryPartner.active_shipment_count,
+                    DeliveryPartner.max_handling_capacity,
+                    select(func.count())
+                    .where(Shipment.delivery_partner_id == DeliveryPartner.id)
+                    .scalar_subquery(),
+                )
+                .where(DeliveryPartner.email.startswith(f"stress-partner-{run}-"))
+            )).all()
+        return sum(created), elapsed, partners
+    finally:
+        async with sessions() as session:
+            shipments = select(Shipment.id).where(Shipment.destination == destination)
+            await session.execute(delete(ShipmentEvent).where(ShipmentEvent.shipment_id.in_(shipments)))
+            await session.execute(delete(Shipment).where(Shipment.destination == destination))
+            owners = select(Seller.id).where(Seller.email == f"stress-seller-{run}@example.com").union(
+                select(DeliveryPartner.id).where(DeliveryPartner.email.startswith(f"stress-partner-{run}-")))
+            await session.execute(delete(ShipmentStatusCount).where(ShipmentStatusCount.owner_id.in_(owners)))
+            await session.execute(delete(DeliveryPartner).where(
+                DeliveryPartner.email.startswith(f"stress-partner-{run}-")))
+            await session.execute(delete(Seller).where(Seller.email == f"stress-seller-{run}@example.com"))
+            await session.commit()
+        coverage_index.invalidate()
+        await engine.dispose()
+        # The batcher's connections belong to this event loop
+        await app_engine.dispose()
+
+
+@pytest.mark.parametrize("strategy", ["first_available", "least_loaded", "weighted", "batched"])
+def test_concurrent_creates_never_overbook(postgres, no_side_effects, monkeypatch, strategy):
+    if strategy == "batched":
+        # Solved in batches with the configured strategy
+        monkeypatch.setattr(assignment_batcher, "window", 0.005)
+        strategy = None
+    created, elapsed, partners = asyncio.run(stress(postgres, strategy))
+
+    assert len(partners) == PARTNERS
+    for active, capacity, shipments in partners:
+        assert active == shipments
+        assert shipments <= capacity
+    assert created == sum(shipments for _, _, shipments in partners)
+    assert created <= PARTNERS * CAPACITY
+    assert REQUESTS / elapsed >= MIN_THROUGHPUT
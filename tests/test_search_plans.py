@@ -0,0 +1,171 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import asyncpg
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.schemas.enums import ShipmentSort, ShipmentStatus
+from app.services.shipment import ShipmentService
+
+pytestmark = pytest.mark.integration
+
+SELLERS = 500
+PARTNERS = 200
+DESTINATIONS = 2_000
+SHIPMENTS = 200_000
+
+SEED = [
+    text("""
+        INSERT INTO sellers (id, name, email, email_verified, password_hash, created_at)
+        SELECT gen_random_uuid(), 'Plan seller', 'plan-seller-' || i || '@example.com', true, '', now()
+        FROM generate_series(1, :sellers) AS i
+    """),
+    text("""
+        INSERT INTO delivery_partners (id, name, email, email_verified, password_hash,
+                                       serviceable_zipcodes, max_handling_capacity,
+                                       active_shipment_count, created_at)
+        SELECT gen_random_uuid(), 'Plan partner', 'plan-partner-' || i || '@example.com', true, '',
+               ARRAY[10000 + i], 1000000, 0, now()
+        FROM generate_series(1, :partners) AS i
+    """),
+    # A year of shipments spread evenly over sellers, partners,
+    # destinations and statuses
+    text("""
+        WITH sellers AS (
+            SELECT array_agg(id) AS ids FROM sellers WHERE email LIKE 'plan-seller-%'
+        ), partners AS (
+            SELECT array_agg(id) AS ids FROM delivery_partners WHERE email LIKE 'plan-partner-%'
+        )
+        INSERT INTO shipments (id, content, weight, destination, estimated_delivery,
+                               client_contact_email, seller_id, delivery_partner_id, created_at,
+                               current_status, version, events_archived)
+        SELECT gen_random_uuid(), 'Parcel', 1, 10000 + floor(random() * :destinations)::int,
+               created + interval '1 day' * (1 + floor(random() * 7)),
+               'client@example.com',
+               sellers.ids[1 + floor(random() * :sellers)::int],
+               partners.ids[1 + floor(random() * :partners)::int],
+               created,
+               (enum_range(NULL::shipmentstatus))[1 + floor(random() * 5)::int],
+               1, false
+        FROM generate_series(1, :shipments) AS i, sellers, partners,
+             LATERAL (SELECT now() - interval '1 second' * floor(random() * 365 * 86400) AS created) AS c
+    """),
+    text("ANALYZE sellers, delivery_partners, shipments"),
+]
+
+
+def cases(seller_id, partner_id) -> dict[str, tuple[Select, set[str]]]:
+    # Queries as the search endpoint builds them, with the indexes
+    # the planner may pick for each
+    query = ShipmentService(None, None, None)._list_query
+    now = datetime.now()
+    return {
+        "seller_newest": (
+            query(seller_id=seller_id),
+            {"ix_shipments_seller_id_created_at"},
+        ),
+        "seller_created_range": (
+            query(seller_id=seller_id, created_after=now - timedelta(days=30),
+                  created_before=now - timedelta(days=20), sort=ShipmentSort.oldest),
+            {"ix_shipments_seller_id_created_at"},
+        ),
+        "partner_status": (
+            query(delivery_partner_id=partner_id, statuses=[ShipmentStatus.delivered]),
+            {"ix_shipments_delivery_partner_id_current_status"},
+        ),
+        "partner_active": (
+            query(delivery_partner_id=partner_id,
+                  statuses=[ShipmentStatus.placed, ShipmentStatus.in_transit]),
+            {"ix_shipments_delivery_partner_id_current_status", "ix_shipments_partner_manifest"},
+        ),
+        "seller_destination": (
+            query(seller_id=seller_id, destination=10_042),
+            {"ix_shipments_destination", "ix_shipments_seller_id_created_at"},
+        ),
+        "partner_eta_window": (
+            query(delivery_partner_id=partner_id, eta_after=now + timedelta(days=2),
+                  eta_before=now + timedelta(days=2, hours=6), sort=ShipmentSort.eta),
+            {"ix_shipments_estimated_delivery", "ix_shipments_delivery_partner_id_current_status"},
+        ),
+    }
+
+
+def walk(node: dict):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+def argument(value) -> str:
+    # Untyped literal, Postgres casts it to the prepared parameter's type
+    value = getattr(value, "value", value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def explain(connection, query: Select, generic: bool) -> list[dict]:
+    if generic:
+        # What the app runs: asyncpg prepares the statement, and after
+        # a few executions Postgres may switch to a plan that ignores
+        # the parameter values
+        compiled = query.compile(dialect=asyncpg.dialect(), compile_kwargs={"render_postcompile": True})
+        arguments = ", ".join(argument(compiled.params[name]) for name in compiled.positiontup)
+        await connection.execute(text("SET LOCAL plan_cache_mode = force_generic_plan"))
+        await connection.exec_driver_sql(f"PREPARE search AS {compiled}")
+        sql = f"EXECUTE search({arguments})"
+    else:
+        sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    try:
+        result = await connection.scalar(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    finally:
+        if generic:
+            await connection.exec_driver_sql("DEALLOCATE search")
+    plan = result if isinstance(result, list) else json.loads(result)
+    return list(walk(plan[0]["Plan"]))
+
+
+async def explain_all(url: str) -> dict[tuple[str, bool], list[dict]]:
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as connection:
+            # Seeded and planned in one transaction that is rolled back
+            transaction = await connection.begin()
+            params = {"sellers": SELLERS, "partners": PARTNERS,
+                      "destinations": DESTINATIONS, "shipments": SHIPMENTS}
+            for statement in SEED:
+                await connection.execute(statement, params)
+
+            seller_id = await connection.scalar(
+                text("SELECT id FROM sellers WHERE email = 'plan-seller-1@example.com'"))
+            partner_id = await connection.scalar(
+                text("SELECT id FROM delivery_partners WHERE email = 'plan-partner-1@example.com'"))
+
+            plans = {}
+            for name, (query, _) in cases(seller_id, partner_id).items():
+                for generic in (False, True):
+                    plans[name, generic] = await explain(connection, query.limit(51), generic)
+            await transaction.rollback()
+        return plans
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def plans(postgres) -> dict[tuple[str, bool], list[dict]]:
+    return asyncio.run(explain_all(postgres))
+
+
+@pytest.mark.parametrize("generic", [False, True], ids=["custom", "generic"])
+@pytest.mark.parametrize("name", list(cases(None, None)))
+def test_search_uses_an_index(plans, name, generic):
+    _, expected = cases(None, None)[name]
+    nodes = plans[name, generic]
+
+    # Bitmap index scans name the index but not the table
+    assert not [node for node in nodes
+                if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "shipments"], nodes
+    assert {node.get("Index Name") for node in nodes} & expected, nodes
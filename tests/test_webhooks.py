@@ -0,0 +1,132 @@
+import hashlib
+import hmac
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.worker import webhooks
+
+
+class Receiver:
+    """Local stand-in for a seller endpoint
+
+    Answers with the queued statuses in order, 200 once they run
+    out, and keeps every request it got.
+    """
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.requests: list[tuple[dict, str]] = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.statuses.pop(0) if receiver.statuses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def verify(secret: str, headers: dict, body: str) -> bool:
+    # What a receiver does with the documented scheme
+    message = f"{headers['X-FastShip-Timestamp']}.{body}".encode()
+    expected = hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(headers["X-FastShip-Signature"], f"sha256={expected}")
+
+
+def test_sign_is_hmac_sha256_of_timestamp_and_body():
+    expected = hmac.new(b"secret", b"1700000000.{}", hashlib.sha256).hexdigest()
+    assert webhooks.sign("secret", "1700000000", "{}") == expected
+    assert webhooks.sign("other", "1700000000", "{}") != expected
+
+
+@pytest.mark.parametrize("attempt", range(1, webhooks.MAX_ATTEMPTS))
+def test_backoff_stays_within_exponential_cap(attempt):
+    cap = min(5 * 2 ** attempt, 3600)
+    delays = [webhooks.backoff(attempt) for _ in range(200)]
+    assert all(0 <= delay <= cap for delay in delays)
+    # Full jitter, not a fixed delay
+    assert len(set(delays)) > 1
+
+
+def test_backoff_caps_at_an_hour():
+    assert max(webhooks.backoff(30) for _ in range(200)) <= 3600
+
+
+def test_post_signs_the_body():
+    body = '{"seller_id": "s", "events": []}'
+    with Receiver() as receiver:
+        assert webhooks.post(receiver.url, "secret", body) == 200
+
+    [(headers, received)] = receiver.requests
+    assert received == body
+    assert headers["Content-Type"] == "application/json"
+    assert verify("secret", headers, body)
+    assert not verify("rotated", headers, body)
+
+
+@pytest.mark.parametrize("status", [408, 429, 500, 503])
+def test_post_fails_retryably_on_server_errors(status):
+    with Receiver(status) as receiver:
+        with pytest.raises(webhooks.DeliveryFailed):
+            webhooks.post(receiver.url, "secret", "{}")
+
+
+@pytest.mark.parametrize("status", [400, 404, 410])
+def test_post_does_not_retry_client_errors(status):
+    with Receiver(status) as receiver:
+        assert webhooks.post(receiver.url, "secret", "{}") == status
+
+
+def test_post_fails_retryably_when_unreachable():
+    with Receiver() as receiver:
+        url = receiver.url
+    with pytest.raises(webhooks.DeliveryFailed):
+        webhooks.post(url, "secret", "{}")
+
+
+def test_retries_until_delivered():
+    attempt = 0
+    delays = []
+    with Receiver(500, 503, 429) as receiver:
+        while True:
+            try:
+                webhooks.post(receiver.url, "secret", "{}")
+                break
+            except webhooks.DeliveryFailed as error:
+                attempt, delay = webhooks.retry_after(error, attempt)
+                delays.append(delay)
+
+    assert attempt == 3
+    assert all(0 <= delay <= 5 * 2 ** (n + 1) for n, delay in enumerate(delays))
+    # Every attempt is signed on its own
+    assert len(receiver.requests) == 4
+    assert all(verify("secret", headers, body) for headers, body in receiver.requests)
+
+
+def test_retry_gives_up_after_max_attempts():
+    error = webhooks.DeliveryFailed("down")
+    with pytest.raises(webhooks.DeliveryFailed):
+        webhooks.retry_after(error, webhooks.MAX_ATTEMPTS - 1)
+
+
+def test_busy_endpoint_does_not_use_an_attempt():
+    attempt, delay = webhooks.retry_after(webhooks.EndpointBusy(), 2)
+    assert attempt == 2
+    assert 0.5 <= delay <= 2.0